@@ -6,6 +6,8 @@ from api.oauth_helper import OauthHelper
 from api.liff_helper import LiffHelper
 from urllib.parse import urlparse
 from utils.error_handler import handle_exception
+from utils.metrics import firestore_metrics
+from linebot_app import event_dispatcher, event_deduplicator
 from datetime import datetime
 import pytz
 
@@ -13,6 +15,10 @@ admin_app = Blueprint('admin_app', __name__)
 
 config = get_config()
 firebaseService = config.firebaseService
+responseCache = config.responseCache
+
+# 使用者管理每頁顯示的人數
+USER_PAGE_SIZE = 200
 
 @admin_app.route('/auth', methods=['POST'])
 def check_admin():
@@ -57,7 +63,8 @@ def firebase():
 @admin_app.route('/users', methods=['GET'])
 def users():
     liff_id = LIFF.ADMIN.value
-    users = firebaseService.get_collection_data(DatabaseCollectionMap.USER)
+    cursor = request.args.get('cursor')
+    users, next_cursor = firebaseService.page(DatabaseCollectionMap.USER, USER_PAGE_SIZE, start_after=cursor)
 
     for user in users:
         user.pop('statusMessage', None)
@@ -98,9 +105,7 @@ def add_news():
             if not data.get(field):
                 return jsonify({'success': False, 'message': f'缺少必要欄位: {field}'})
         # 生成新的公告ID
-        existing_news = firebaseService.get_collection_data(DatabaseCollectionMap.NEWS)
-        max_id = max([n.get('news_id', 0) for n in existing_news], default=0)
-        data['news_id'] = max_id + 1
+        data['news_id'] = firebaseService.next_id(DatabaseCollectionMap.NEWS, 'news_id')
         data['views'] = 0
         data['created_at'] = datetime.now(pytz.timezone('Asia/Taipei'))
         data['updated_at'] = datetime.now(pytz.timezone('Asia/Taipei'))
@@ -168,12 +173,11 @@ def add_course():
                 return jsonify({'success': False, 'message': f'缺少必要欄位: {field}'})
         
         # 生成新的課程ID
-        existing_courses = firebaseService.get_collection_data(DatabaseCollectionMap.COURSE)
-        max_id = max([c.get('course_id', 0) for c in existing_courses], default=0)
-        data['course_id'] = max_id + 1
+        data['course_id'] = firebaseService.next_id(DatabaseCollectionMap.COURSE, 'course_id')
         
         # 儲存到 Firebase
         firebaseService.add_data(DatabaseCollectionMap.COURSE, str(data['course_id']), data)
+        responseCache.invalidate(DatabaseCollectionMap.COURSE)
         
         # 回傳新增的課程資料
         return jsonify({
@@ -194,6 +198,7 @@ def update_course(course_id):
         
         # 更新課程
         firebaseService.update_data(DatabaseCollectionMap.COURSE, str(course_id), data)
+        responseCache.invalidate(DatabaseCollectionMap.COURSE)
         
         # 回傳更新的課程資料
         return jsonify({
@@ -209,6 +214,7 @@ def update_course(course_id):
 def delete_course(course_id):
     try:
         firebaseService.delete_data(DatabaseCollectionMap.COURSE, str(course_id))
+        responseCache.invalidate(DatabaseCollectionMap.COURSE)
         
         # 回傳刪除的課程ID
         return jsonify({
@@ -238,9 +244,7 @@ def add_course_open():
                 return jsonify({'success': False, 'message': f'缺少必要欄位: {field}'})
         
         # 生成新的開課ID
-        existing_records = firebaseService.get_collection_data(DatabaseCollectionMap.COURSE_OPEN)
-        max_id = max([c.get('id', 0) for c in existing_records], default=0)
-        data['id'] = max_id + 1
+        data['id'] = firebaseService.next_id(DatabaseCollectionMap.COURSE_OPEN, 'id')
         
         data['course'] = data.pop('course_id')
         # 設定 reference 欄位
@@ -255,6 +259,7 @@ def add_course_open():
             data, 
             ref_fields
         )
+        responseCache.invalidate(DatabaseCollectionMap.COURSE_OPEN)
         
         # 回傳新增的開課記錄
         return jsonify({
@@ -286,6 +291,7 @@ def update_course_open(record_id):
             data, 
             ref_fields
         )
+        responseCache.invalidate(DatabaseCollectionMap.COURSE_OPEN)
         
         # 回傳更新的開課記錄
         return jsonify({
@@ -301,6 +307,7 @@ def update_course_open(record_id):
 def delete_course_open(record_id):
     try:
         firebaseService.delete_data(DatabaseCollectionMap.COURSE_OPEN, str(record_id))
+        responseCache.invalidate(DatabaseCollectionMap.COURSE_OPEN)
         
         # 回傳刪除的記錄ID
         return jsonify({
@@ -335,9 +342,7 @@ def add_video():
                 return jsonify({'success': False, 'message': f'缺少必要欄位: {field}'})
         
         # 生成新的影片ID
-        existing_videos = firebaseService.get_collection_data(DatabaseCollectionMap.VIDEO)
-        max_id = max([v.get('video_id', 0) for v in existing_videos], default=0)
-        data['video_id'] = max_id + 1
+        data['video_id'] = firebaseService.next_id(DatabaseCollectionMap.VIDEO, 'video_id')
         
         # 儲存到 Firebase
         firebaseService.add_data(DatabaseCollectionMap.VIDEO, str(data['video_id']), data)
@@ -478,6 +483,7 @@ def api_firebase_update():
         if collection not in firebaseService.list_collections():
             return jsonify({'success': False, 'message': f'找不到 collection: {collection}'})
         firebaseService.update_data(collection, doc_id, update_data)
+        responseCache.invalidate(collection)
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -493,6 +499,7 @@ def api_firebase_delete():
         if collection not in firebaseService.list_collections():
             return jsonify({'success': False, 'message': f'找不到 collection: {collection}'})
         firebaseService.delete_data(collection, doc_id)
+        responseCache.invalidate(collection)
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -502,7 +509,8 @@ def api_firebase_fields():
     collection = request.args.get('collection')
     if collection not in firebaseService.list_collections():
         return jsonify({'success': False, 'fields': []})
-    docs = firebaseService.get_collection_data(collection)
+    # 只需要一筆文件來取得欄位名稱
+    docs, _ = firebaseService.page(collection, 1)
     if not docs:
         return jsonify({'success': True, 'fields': []})
     field_set = set(docs[0].keys())
@@ -510,14 +518,36 @@ def api_firebase_fields():
 
     return jsonify({'success': True, 'fields': list(field_set)})
 
+@admin_app.route('/api/metrics', methods=['GET'])
+def api_metrics():
+    """取得 Firestore 操作統計（僅限管理員）"""
+    try:
+        user_id = request.args.get('userId')
+        user = firebaseService.get_data(DatabaseCollectionMap.USER, user_id) if user_id else None
+        if not user or user.get('permission') != Permission.ADMIN:
+            return jsonify({'success': False, 'message': '權限不足'}), 403
+        return jsonify({'success': True, 'data': {
+            'firestore': firestore_metrics.snapshot(),
+            'webhook_dispatcher': event_dispatcher.stats(),
+            'webhook_deduplicator': event_deduplicator.stats(),
+            'response_cache': responseCache.stats()
+        }})
+    except Exception as e:
+        return handle_exception(e)
+
 def handle_update_users():
     """處理更新使用者資訊的操作"""
     try:
-        users_data = firebaseService.get_collection_data(DatabaseCollectionMap.USER)
-        for user in users_data:
-            user_info = LineBotHelper.get_user_info(user['userId'])
-            if user_info:
-                firebaseService.update_data(DatabaseCollectionMap.USER, user['userId'], user_info)
+        users_data = firebaseService.iter_collection(DatabaseCollectionMap.USER, fields=['userId'])
+        batch = firebaseService.batch()
+        try:
+            for user in users_data:
+                user_info = LineBotHelper.get_user_info(user['userId'])
+                if user_info:
+                    batch.update_data(DatabaseCollectionMap.USER, user['userId'], user_info)
+        finally:
+            # 中途取得使用者資訊失敗時，仍寫入失敗前已取得的更新
+            batch.commit()
         return {
             'success': True,
             'message': '使用者資訊更新成功'
@@ -1,15 +1,97 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
 from google.cloud.firestore_v1 import query, aggregation
+from google.api_core.exceptions import AlreadyExists
+from map import DatabaseCollectionMap
+from utils.metrics import firestore_metrics
 import threading
+import time
+
+class FireBaseBatch:
+    """批次寫入，將多筆新增、更新、刪除合併為一次 commit
+    
+    可作為 context manager 使用，區塊正常結束時自動 commit：
+        with firebaseService.batch() as batch:
+            batch.update_data(...)
+            batch.delete_data(...)
+    
+    單次 commit 為原子操作；超過 Firestore 上限（500 筆）時會自動分段 commit，
+    此時僅各段內保證原子性。
+    """
+    MAX_OPERATIONS = 500
+
+    def __init__(self, service):
+        self._service = service
+        self._batch = service.db.batch()
+        self._count = 0
+        self._collections = set()
+
+    def _document(self, collection, doc_id):
+        self._collections.add(collection)
+        return self._service.db.collection(collection).document(doc_id)
+
+    def _queued(self):
+        """記錄已排入的操作數，達上限時先行 commit"""
+        self._count += 1
+        if self._count >= self.MAX_OPERATIONS:
+            self.commit()
+
+    def add_data(self, collection, doc_id, data, ref_fields=None):
+        """排入新增資料（參數同 FireBaseService.add_data）"""
+        processed_data = self._service._process_ref_fields(data, ref_fields, operation='add')
+        self._batch.set(self._document(collection, doc_id), processed_data)
+        self._queued()
+
+    def update_data(self, collection, doc_id, data, ref_fields=None):
+        """排入更新資料（參數同 FireBaseService.update_data）"""
+        processed_data = self._service._process_ref_fields(data, ref_fields, operation='add')
+        self._batch.update(self._document(collection, doc_id), processed_data)
+        self._queued()
+
+    def merge_data(self, collection, doc_id, data):
+        """排入合併寫入（set merge=True）：文件不存在時建立，巢狀 dict 逐欄合併，可搭配 increment 使用"""
+        self._batch.set(self._document(collection, doc_id), data, merge=True)
+        self._queued()
+
+    def delete_data(self, collection, doc_id):
+        """排入刪除資料"""
+        self._batch.delete(self._document(collection, doc_id))
+        self._queued()
+
+    def commit(self):
+        """送出目前排入的所有操作"""
+        if self._count:
+            with firestore_metrics.track('commit', ','.join(sorted(self._collections))) as record:
+                self._batch.commit()
+                record['documents'] = self._count
+        self._batch = self._service.db.batch()
+        self._count = 0
+        self._collections = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        return False
 
 class FireBaseService:
+    # 等待集合快取首次載入完成的秒數，逾時則改為直接讀取 Firestore
+    CACHE_READY_TIMEOUT = 10
+    # 監聽逾時或中止後，直接讀取 Firestore 的秒數，之後才再次嘗試等待（必要時重新監聽）
+    CACHE_RETRY_INTERVAL = 60
+
     def __init__(self, cred):
         self.cred = credentials.Certificate(cred)
         firebase_admin.initialize_app(self.cred)
         self.db = firestore.client()
         self.callback_done = threading.Event()
+        # 以 on_snapshot 同步至記憶體的集合快取 {collection: {'docs', 'ready', 'watch', 'failed_at', ...}}
+        self._collection_caches = {}
+        self._cache_lock = threading.Lock()
 
     def _get_collection_ref(self, collection):
         """取得集合參考"""
@@ -31,6 +113,20 @@ class FireBaseService:
             return collection_ref.order_by(field, direction=direction)
         return collection_ref
 
+    def _apply_projection(self, collection_ref, fields):
+        """套用欄位投影到集合參考
+        
+        Args:
+            collection_ref: 集合參考
+            fields: 需要取回的欄位名稱列表，None 表示取回全部欄位
+        
+        Returns:
+            投影後的集合參考
+        """
+        if fields:
+            return collection_ref.select(list(fields))
+        return collection_ref
+
     def _docs_to_dict_list(self, docs):
         """將文件列表轉換為字典列表
         
@@ -78,6 +174,9 @@ class FireBaseService:
     def _process_docs_with_refs(self, docs, ref_fields):
         """處理文件列表並解構參考欄位
         
+        先收集整個結果集中不重複的 DocumentReference，再以一次 get_all 批次讀取，
+        重複的參考只會讀取一次。
+        
         Args:
             docs: 文件迭代器
             ref_fields: 需要解構的參考欄位名稱列表
@@ -85,25 +184,46 @@ class FireBaseService:
         Returns:
             處理後的文件列表
         """
-        result = []
-        
-        for doc in docs:
-            doc_data = {'doc_id': doc.id, **doc.to_dict()}
-            
-            # 將 ref_fields 轉換為字典格式以配合 _process_ref_fields
-            if ref_fields:
-                ref_fields_dict = {field: None for field in ref_fields}
-                doc_data = self._process_ref_fields(doc_data, ref_fields_dict, operation='get')
-            
-            result.append(doc_data)
+        result = self._docs_to_dict_list(docs)
+
+        # 收集不重複的參考
+        refs = {}
+        for doc_data in result:
+            for field in ref_fields:
+                ref = doc_data.get(field)
+                if ref and hasattr(ref, 'path'):
+                    refs[ref.path] = ref
+
+        if not refs:
+            return result
+
+        # 批次讀取參考文件
+        ref_collections = ','.join(sorted({ref.parent.id for ref in refs.values()}))
+        with firestore_metrics.track('get_all', ref_collections) as record:
+            ref_docs = {
+                ref_doc.reference.path: ref_doc.to_dict()
+                for ref_doc in self.db.get_all(list(refs.values()))
+                if ref_doc.exists
+            }
+            record['documents'] = len(ref_docs)
+
+        for doc_data in result:
+            for field in ref_fields:
+                ref = doc_data.get(field)
+                if ref and hasattr(ref, 'path') and ref.path in ref_docs:
+                    # 複製一份，避免多筆文件共用同一個 dict
+                    doc_data[field] = dict(ref_docs[ref.path])
+                    doc_data[f'{field}_id'] = ref.id
         
         return result
 
+    @firestore_metrics.instrument('list_collections')
     def list_collections(self):
         """取得所有 collection 名稱"""
         return [c.id for c in self.db.collections()]
 
-    def get_collection_data(self, collection, order_by=None, ref_fields=None):
+    @firestore_metrics.instrument('query')
+    def get_collection_data(self, collection, order_by=None, ref_fields=None, fields=None):
         """取得集合所有資料
         
         Args:
@@ -112,11 +232,14 @@ class FireBaseService:
                 direction: "asc" or "desc" (default: "asc")
                 Example: ("age", "desc")
             ref_fields (list, optional): 需要解構的 reference 欄位名稱列表
+            fields (list, optional): 只取回的欄位名稱列表（Firestore select）
+                Example: ["userId"]
         
         Returns:
             list: 包含資料的文件列表
         """
         collection_ref = self._get_collection_ref(collection)
+        collection_ref = self._apply_projection(collection_ref, fields)
         collection_ref = self._apply_ordering(collection_ref, order_by)
         docs = collection_ref.stream()
         
@@ -125,6 +248,7 @@ class FireBaseService:
         else:
             return self._docs_to_dict_list(docs)
 
+    @firestore_metrics.instrument('get')
     def get_data(self, collection, doc_id, ref_fields=None):
         """取得資料"""
         doc_ref = self.db.collection(collection).document(doc_id)
@@ -134,7 +258,31 @@ class FireBaseService:
         else:
             return doc.to_dict()
     
-    def filter_data(self, collection, conditions, order_by=None, limit=None, ref_fields=None):
+    @firestore_metrics.instrument('get_all')
+    def get_multiple_data(self, collection, doc_ids, ref_fields=None):
+        """以一次 get_all 批次取得多筆資料
+        
+        Args:
+            collection (str): 集合名稱
+            doc_ids (list): 文件ID列表
+            ref_fields (list, optional): 需要解構的 reference 欄位名稱列表
+        
+        Returns:
+            list: 包含資料的文件列表（不存在的文件會被略過）
+        """
+        collection_ref = self._get_collection_ref(collection)
+        doc_refs = [collection_ref.document(str(doc_id)) for doc_id in dict.fromkeys(doc_ids)]
+        if not doc_refs:
+            return []
+        docs = [doc for doc in self.db.get_all(doc_refs) if doc.exists]
+        
+        if ref_fields:
+            return self._process_docs_with_refs(docs, ref_fields)
+        else:
+            return self._docs_to_dict_list(docs)
+    
+    @firestore_metrics.instrument('query')
+    def filter_data(self, collection, conditions, order_by=None, limit=None, ref_fields=None, fields=None):
         """篩選資料
         
         Args:
@@ -149,11 +297,14 @@ class FireBaseService:
                 Example: ("age", "desc")
             limit (int, optional): 限制返回的文件數量
             ref_fields (list, optional): 需要解構的 reference 欄位名稱列表
+            fields (list, optional): 只取回的欄位名稱列表（Firestore select）
+                Example: ["userId"]
         
         Returns:
             list: 包含資料的文件列表
         """
         collection_ref = self._get_collection_ref(collection)
+        collection_ref = self._apply_projection(collection_ref, fields)
         
         # 套用篩選條件
         for condition in conditions:
@@ -173,6 +324,52 @@ class FireBaseService:
         else:
             return self._docs_to_dict_list(docs)
     
+    @firestore_metrics.instrument('query')
+    def page(self, collection, page_size, start_after=None, conditions=None, fields=None):
+        """以游標分頁取得集合資料（依文件ID排序）
+        
+        Args:
+            collection (str): 集合名稱
+            page_size (int): 每頁文件數量
+            start_after (str, optional): 游標，從該文件ID之後開始取得
+            conditions (list, optional): 篩選條件列表，格式同 filter_data
+            fields (list, optional): 只取回的欄位名稱列表
+        
+        Returns:
+            tuple: (文件列表, 下一頁游標)，已無下一頁時游標為 None
+        """
+        collection_ref = self._get_collection_ref(collection)
+        query_ref = self._apply_projection(collection_ref, fields)
+        for condition in conditions or []:
+            query_ref = query_ref.where(filter=FieldFilter(*condition))
+        query_ref = query_ref.order_by(FieldPath.document_id())
+        if start_after:
+            query_ref = query_ref.start_after({FieldPath.document_id(): collection_ref.document(start_after)})
+        docs = self._docs_to_dict_list(query_ref.limit(page_size).stream())
+        next_cursor = docs[-1]['doc_id'] if len(docs) == page_size else None
+        return docs, next_cursor
+
+    def iter_collection(self, collection, page_size=500, start_after=None, conditions=None, fields=None):
+        """逐頁串流集合資料，記憶體用量只與 page_size 相關
+        
+        Args:
+            collection (str): 集合名稱
+            page_size (int, optional): 每次向 Firestore 取得的文件數量
+            start_after (str, optional): 游標，從該文件ID之後開始取得
+            conditions (list, optional): 篩選條件列表，格式同 filter_data
+            fields (list, optional): 只取回的欄位名稱列表
+        
+        Yields:
+            dict: 包含 doc_id 的文件資料
+        """
+        cursor = start_after
+        while True:
+            docs, cursor = self.page(collection, page_size, start_after=cursor, conditions=conditions, fields=fields)
+            yield from docs
+            if not cursor:
+                return
+
+    @firestore_metrics.instrument('count')
     def get_aggregate_count(self, collection, conditions):
         """
         取得collection經過條件篩選後的總筆數
@@ -186,6 +383,7 @@ class FireBaseService:
 
         return results[0][0].value
     
+    @firestore_metrics.instrument('set', documents=1)
     def add_data(self, collection, doc_id, data, ref_fields=None):
         """新增資料
         
@@ -201,6 +399,25 @@ class FireBaseService:
         doc_ref = self.db.collection(collection).document(doc_id)
         doc_ref.set(processed_data)
 
+    @firestore_metrics.instrument('create', documents=1)
+    def create_data(self, collection, doc_id, data) -> bool:
+        """新增資料，文件已存在時不覆寫
+
+        Args:
+            collection (str): 集合名稱
+            doc_id (str): 文件ID
+            data (dict): 要儲存的資料
+
+        Returns:
+            bool: 是否成功新增（文件已存在時為 False）
+        """
+        try:
+            self.db.collection(collection).document(doc_id).create(data)
+            return True
+        except AlreadyExists:
+            return False
+
+    @firestore_metrics.instrument('update', documents=1)
     def update_data(self, collection, doc_id, data, ref_fields=None):
         """更新資料
         
@@ -216,36 +433,175 @@ class FireBaseService:
         doc_ref = self.db.collection(collection).document(doc_id)
         doc_ref.update(processed_data)
 
+    @firestore_metrics.instrument('delete', documents=1)
     def delete_data(self, collection, doc_id):
         """刪除資料"""
         doc_ref = self.db.collection(collection).document(doc_id)
         doc_ref.delete()
 
-    def on_snapshot(self, collection):
-        """監聽文件變更"""
+    @firestore_metrics.instrument('transaction')
+    def next_id(self, collection, id_field='id'):
+        """以交易遞增計數文件，取得集合的下一個流水號
+        
+        計數文件存放於 counters/<collection>，首次使用時以集合中 id_field 的最大值初始化，
+        之後每次只需讀寫計數文件，且多人同時新增也不會取得相同的流水號。
+        
+        Args:
+            collection (str): 集合名稱
+            id_field (str, optional): 流水號欄位名稱，用於初始化計數
+        
+        Returns:
+            int: 新的流水號
+        """
+        counter_ref = self.db.collection(DatabaseCollectionMap.COUNTER).document(collection)
+        max_id_query = self._apply_ordering(self._get_collection_ref(collection), (id_field, 'desc')).limit(1)
+
+        @firestore.transactional
+        def allocate(transaction):
+            snapshot = counter_ref.get(transaction=transaction)
+            if snapshot.exists:
+                current_id = snapshot.get('value')
+            else:
+                docs = list(max_id_query.stream(transaction=transaction))
+                current_id = docs[0].to_dict().get(id_field, 0) if docs else 0
+            transaction.set(counter_ref, {'value': current_id + 1})
+            return current_id + 1
+
+        return allocate(self.db.transaction())
+
+    @staticmethod
+    def increment(value=1):
+        """Returns
+        Increment: 伺服器端原子遞增，可作為 add_data/update_data 的欄位值
+        """
+        return firestore.Increment(value)
+
+    @staticmethod
+    def delete_field():
+        """Returns
+        Sentinel: 刪除欄位，可作為 update_data 的欄位值
+        """
+        return firestore.DELETE_FIELD
+
+    def batch(self):
+        """Returns
+        FireBaseBatch: 批次寫入物件，排入的操作於 commit 時以一次 RPC 送出
+        """
+        return FireBaseBatch(self)
+
+    def cache_collection(self, collection):
+        """將整個集合載入記憶體，並以 on_snapshot 監聽維持同步
+        
+        Args:
+            collection (str): 集合名稱
+        """
+        with self._cache_lock:
+            if collection in self._collection_caches:
+                return
+            cache = {'docs': {}, 'ready': threading.Event(), 'watch': None, 'callback': None, 'listeners': [], 'failed_at': None, 'resync': False}
+            self._collection_caches[collection] = cache
+
         def callback(doc_snapshot, changes, read_time):
+            if cache['resync']:
+                # 重新監聽後的第一次同步：監聽中斷期間被刪除的文件不會出現在 changes，需依完整快照移除
+                cache['resync'] = False
+                current_ids = {doc.id for doc in doc_snapshot}
+                for doc_id in [doc_id for doc_id in cache['docs'] if doc_id not in current_ids]:
+                    cache['docs'].pop(doc_id, None)
+                    for listener in list(cache['listeners']):
+                        listener('REMOVED', doc_id, None)
             for change in changes:
-                # 檢測變更類型
-                if change.type.name == 'MODIFIED':
-                    print(f"Document modified: {change.document.id}")
-                    self.update_correct_rate(change.document)
-
-        # 監聽集合
-        doc_ref = self.db.collection(collection)
-        doc_watch = doc_ref.on_snapshot(callback)
-        return doc_watch
-    
-    def update_correct_rate(self, document):
-        """根據 total_count 和 correct_count 更新 correct_rate"""
-        data = document.to_dict()
-        total_count = data.get('total_count', 0)
-        correct_count = data.get('correct_count', 0)
-
-        # 避免除以零的錯誤
-        correct_rate = round((correct_count / total_count)*100, 2) if total_count > 0 else 0
-
-        # 更新文檔的 correct_rate 欄位
-        document.reference.update({
-            'correct_rate': correct_rate
-        })
-        print(f"Updated correct_rate for document {document.id}: {correct_rate}")
+                doc_id = change.document.id
+                if change.type.name == 'REMOVED':
+                    cache['docs'].pop(doc_id, None)
+                    data = None
+                else:
+                    data = change.document.to_dict()
+                    cache['docs'][doc_id] = data
+                for listener in list(cache['listeners']):
+                    listener(change.type.name, doc_id, dict(data) if data is not None else None)
+            cache['failed_at'] = None
+            cache['ready'].set()
+
+        cache['callback'] = callback
+        cache['watch'] = self._get_collection_ref(collection).on_snapshot(callback)
+
+    def _cache_ready(self, collection, timeout=None):
+        """檢查集合快取是否可用
+
+        只有第一次（或每隔 CACHE_RETRY_INTERVAL 秒重試時）會等待首次同步；
+        等待逾時或監聽已中止時記錄失敗時間，之後的呼叫立即回傳 False，由呼叫端改為直接讀取。
+
+        Returns:
+            bool: 快取是否已同步且監聽仍在運作
+        """
+        cache = self._collection_caches[collection]
+        watch = cache['watch']
+        if watch is not None and not getattr(watch, 'is_active', True) and cache['failed_at'] is None:
+            # 監聽已中止，快取不再更新
+            cache['ready'].clear()
+            cache['failed_at'] = time.monotonic()
+        if cache['ready'].is_set():
+            return True
+        with self._cache_lock:
+            failed_at = cache['failed_at']
+            if failed_at is not None:
+                if time.monotonic() - failed_at < self.CACHE_RETRY_INTERVAL:
+                    return False
+                # 由目前的呼叫者負責重試，其他呼叫者在重試期間直接讀取
+                cache['failed_at'] = time.monotonic()
+                if not getattr(cache['watch'], 'is_active', True):
+                    cache['resync'] = True
+                    cache['watch'] = self._get_collection_ref(collection).on_snapshot(cache['callback'])
+        if cache['ready'].wait(self.CACHE_READY_TIMEOUT if timeout is None else timeout):
+            return True
+        print(f'Cache of {collection} is not ready, reading from Firestore')
+        cache['failed_at'] = time.monotonic()
+        return False
+
+    def wait_cache_ready(self, collection, timeout=None):
+        """等待集合快取完成首次同步，快取尚未建立時會先建立監聽
+
+        Args:
+            collection (str): 集合名稱
+            timeout (float, optional): 最多等待的秒數，預設為 CACHE_READY_TIMEOUT
+
+        Returns:
+            bool: 是否已完成同步（先前已逾時或監聽中止時立即回傳 False）
+        """
+        self.cache_collection(collection)
+        return self._cache_ready(collection, timeout)
+
+    def get_cached_data(self, collection, doc_id):
+        """從記憶體快取取得資料，快取尚未建立時會先建立監聽
+        
+        Args:
+            collection (str): 集合名稱
+            doc_id (str): 文件ID
+        
+        Returns:
+            dict: 文件資料的複本，文件不存在時回傳 None
+        """
+        self.cache_collection(collection)
+        if not self._cache_ready(collection):
+            # 監聽尚未完成首次同步或已中止，改為直接讀取
+            return self.get_data(collection, doc_id)
+        doc = self._collection_caches[collection]['docs'].get(doc_id)
+        return dict(doc) if doc is not None else None
+
+    def on_snapshot(self, collection, callback):
+        """監聽集合變更，集合會同時載入記憶體快取
+        
+        註冊時會先以 'ADDED' 重播快取中已有的文件，之後每次變更呼叫
+        callback(change_type, doc_id, data)，change_type 為 'ADDED'、'MODIFIED' 或 'REMOVED'
+        （'REMOVED' 時 data 為 None）。重播與首次同步可能重複通知同一份文件，callback 需可重複套用。
+        
+        Args:
+            collection (str): 集合名稱
+            callback (callable): 變更時呼叫的函式
+        """
+        self.cache_collection(collection)
+        cache = self._collection_caches[collection]
+        cache['listeners'].append(callback)
+        for doc_id, data in list(cache['docs'].items()):
+            callback('ADDED', doc_id, dict(data))
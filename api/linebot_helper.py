@@ -1,6 +1,7 @@
 from config import get_config
 from map import DatabaseCollectionMap
-from utils.utils import replace_variable
+from utils.utils import CompiledTemplate, RenderedTemplate
+from utils.flex_validator import FlexValidator, FlexValidationError
 from linebot.v3.messaging import (
     ApiClient,
     ApiException,
@@ -19,6 +20,8 @@ from linebot.v3.messaging import (
     QuickReplyItem,
     ShowLoadingAnimationRequest,
     ValidateMessageRequest,
+    FlexMessage,
+    FlexContainer,
     SetWebhookEndpointRequest,
     RichMenuBulkLinkRequest,
     RichMenuBulkUnlinkRequest,
@@ -28,56 +31,177 @@ from linebot.v3.messaging import (
     RichMenuBatchUnlinkAllOperation
 )
 import requests
+import threading
+import atexit
 import random
 import json
 import re
 import pytz
 from datetime import datetime
+from functools import lru_cache
 
 config = get_config()
 configuration = config.configuration
 firebaseService = config.firebaseService
 
+class ApiClientHelper:
+    """
+    程序內共用的 LINE Messaging API client
+
+    所有 helper 共用同一個 ApiClient（urllib3 連線池，連線數由 LINE_API_POOL_SIZE 設定），
+    連線保持 keep-alive，避免每次呼叫都重新建立 TLS 連線；程序結束時自動關閉。
+    """
+    _api_client = None
+    _messaging_api = None
+    _messaging_api_blob = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_api_client() -> ApiClient:
+        """Returns
+        ApiClient: 共用的 ApiClient
+        """
+        if __class__._api_client is None:
+            with __class__._lock:
+                if __class__._api_client is None:
+                    api_client = ApiClient(configuration)
+                    __class__._messaging_api = MessagingApi(api_client)
+                    __class__._messaging_api_blob = MessagingApiBlob(api_client)
+                    __class__._api_client = api_client
+                    atexit.register(__class__.close)
+        return __class__._api_client
+
+    @staticmethod
+    def get_messaging_api() -> MessagingApi:
+        """Returns
+        MessagingApi: 使用共用連線池的 MessagingApi
+        """
+        __class__.get_api_client()
+        return __class__._messaging_api
+
+    @staticmethod
+    def get_messaging_api_blob() -> MessagingApiBlob:
+        """Returns
+        MessagingApiBlob: 使用共用連線池的 MessagingApiBlob
+        """
+        __class__.get_api_client()
+        return __class__._messaging_api_blob
+
+    @staticmethod
+    def close():
+        """
+        關閉共用的 ApiClient 及其連線池
+        """
+        with __class__._lock:
+            api_client = __class__._api_client
+            __class__._api_client = None
+            __class__._messaging_api = None
+            __class__._messaging_api_blob = None
+        if api_client is not None:
+            api_client.close()
+            api_client.rest_client.pool_manager.clear()
+
+    @staticmethod
+    def post_json(resource_path: str, body: str):
+        """
+        以共用連線池直接送出 JSON 字串（不經過 SDK 的模型序列化）
+
+        Args:
+            resource_path (str): API 路徑，例如 /v2/bot/message/reply
+            body (str): 請求內容（JSON 字串）
+        """
+        api_client = __class__.get_api_client()
+        response = api_client.rest_client.pool_manager.request(
+            'POST',
+            f'{configuration.host}{resource_path}',
+            body=body.encode('utf-8'),
+            headers={
+                **api_client.default_headers,
+                'Authorization': f'Bearer {configuration.access_token}',
+                'Content-Type': 'application/json'
+            }
+        )
+        if not 200 <= response.status < 300:
+            error = ApiException(status=response.status, reason=response.reason)
+            error.body = response.data.decode('utf-8', errors='replace')
+            error.headers = response.headers
+            raise error
+        return response
+
+class FlexJson:
+    """
+    已組好的 Flex Message（contents 為 JSON 字串）
+
+    與 FlexMessage 用法相同，但不建立 FlexContainer 模型，送出時直接將 JSON 字串嵌入請求內容：
+        FlexJson(alt_text='常見問答', contents=line_flex_str)
+    """
+    __slots__ = ('alt_text', 'contents', 'quick_reply')
+
+    def __init__(self, alt_text: str, contents: str, quick_reply: QuickReply = None):
+        self.alt_text = alt_text
+        self.contents = contents
+        self.quick_reply = quick_reply
+
+    def to_json(self) -> str:
+        """Returns
+        str: 訊息 JSON
+        """
+        quick_reply = f',"quickReply":{self.quick_reply.to_json()}' if self.quick_reply else ''
+        return f'{{"type":"flex","altText":{json.dumps(self.alt_text, ensure_ascii=False)},"contents":{self.contents}{quick_reply}}}'
+
+    def to_message(self) -> FlexMessage:
+        """Returns
+        FlexMessage: 對應的 SDK 訊息物件（需要 SDK 模型時使用，例如 validate_reply）
+        """
+        return FlexMessage(alt_text=self.alt_text, contents=FlexContainer.from_json(self.contents), quick_reply=self.quick_reply)
+
 class LineBotHelper:
     @staticmethod
     def get_user_info(user_id: str):
         """Returns
         dict: 使用者資訊
         """
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
-            return line_bot_api.get_profile(user_id).to_dict()
+        line_bot_api = ApiClientHelper.get_messaging_api()
+        return line_bot_api.get_profile(user_id).to_dict()
 
     @staticmethod
     def check_is_fixing():
         """Returns 
         bool: 是否維修中
         """
-        return firebaseService.get_data(
+        # config 集合由 on_snapshot 同步至記憶體，維護狀態變更會即時反映
+        system_config = firebaseService.get_cached_data(
             DatabaseCollectionMap.CONFIG,
             'system'
-        ).get('fixing', False)
+        ) or {}
+        return system_config.get('fixing', False)
 
     @staticmethod
     def show_loading_animation_(event, time: int=10):
         """
         顯示載入動畫
         """
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
-            line_bot_api.show_loading_animation(
-                ShowLoadingAnimationRequest(chatId=event.source.user_id, loadingSeconds=time)
-            )
+        line_bot_api = ApiClientHelper.get_messaging_api()
+        line_bot_api.show_loading_animation(
+            ShowLoadingAnimationRequest(chatId=event.source.user_id, loadingSeconds=time)
+        )
         
     @staticmethod
     def reply_message(event, messages: list):
         """
         回覆多則訊息
         """
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
-            # 為了避免回覆訊息時發生錯誤（通常是Flex string解析異常），先檢查訊息是否合法
-            line_bot_api.validate_reply(ValidateMessageRequest(messages=messages))
+        line_bot_api = ApiClientHelper.get_messaging_api()
+        # 為了避免回覆訊息時發生錯誤（通常是Flex string解析異常），先檢查訊息是否合法
+        # 預設於本地檢查，設定 FLEX_VALIDATION_MODE=remote 時改用 LINE API 檢查（除錯用）
+        if config.FLEX_VALIDATION_MODE == 'local':
+            FlexValidator.validate_messages(messages)
+        elif config.FLEX_VALIDATION_MODE == 'remote':
+            line_bot_api.validate_reply(ValidateMessageRequest(messages=__class__.__to_sdk_messages(messages)))
+        if __class__.__has_raw_messages(messages):
+            # 含有 FlexJson 時直接送出 JSON，不建立 SDK 模型
+            ApiClientHelper.post_json('/v2/bot/message/reply', __class__.__build_request_json({'replyToken': event.reply_token}, messages))
+        else:
             line_bot_api.reply_message_with_http_info(
                 ReplyMessageRequest(
                     reply_token=event.reply_token,
@@ -90,8 +214,10 @@ class LineBotHelper:
         """
         推播多則訊息給多位user
         """
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
+        if __class__.__has_raw_messages(messages):
+            ApiClientHelper.post_json('/v2/bot/message/multicast', __class__.__build_request_json({'to': user_ids}, messages))
+        else:
+            line_bot_api = ApiClientHelper.get_messaging_api()
             line_bot_api.multicast_with_http_info(
                 MulticastRequest(
                     to=user_ids,
@@ -104,14 +230,38 @@ class LineBotHelper:
         """
         推播多則訊息給一位user
         """
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
+        if __class__.__has_raw_messages(messages):
+            ApiClientHelper.post_json('/v2/bot/message/push', __class__.__build_request_json({'to': user_id}, messages))
+        else:
+            line_bot_api = ApiClientHelper.get_messaging_api()
             line_bot_api.push_message_with_http_info(
                 PushMessageRequest(
                     to=user_id,
                     messages=messages
                 )
             )
+
+    @staticmethod
+    def __has_raw_messages(messages: list) -> bool:
+        """Returns
+        bool: 是否包含 FlexJson（需以 JSON 字串直接送出）
+        """
+        return any(isinstance(message, FlexJson) for message in messages)
+
+    @staticmethod
+    def __to_sdk_messages(messages: list) -> list:
+        """Returns
+        list: 將 FlexJson 轉為 SDK 訊息物件後的訊息列表
+        """
+        return [message.to_message() if isinstance(message, FlexJson) else message for message in messages]
+
+    @staticmethod
+    def __build_request_json(fields: dict, messages: list) -> str:
+        """Returns
+        str: 請求內容 JSON，messages 以各訊息的 JSON 直接串接
+        """
+        messages_json = ','.join(message.to_json() for message in messages)
+        return f'{json.dumps(fields, ensure_ascii=False)[:-1]},"messages":[{messages_json}]}}'
     
     @staticmethod
     def create_action(action: dict):
@@ -138,38 +288,35 @@ class WebhookHelper:
         """
         取得 LINE Bot 的 Webhook URL
         """
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
-            response = line_bot_api.get_webhook_endpoint()
-            return response.endpoint
+        line_bot_api = ApiClientHelper.get_messaging_api()
+        response = line_bot_api.get_webhook_endpoint()
+        return response.endpoint
     
     @staticmethod
     def set_webhook_url(webhook_url: str):
         """
         設定 LINE Bot 的 Webhook URL
         """
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
-            try:
-                line_bot_api.set_webhook_endpoint(
-                    SetWebhookEndpointRequest(
-                        endpoint=webhook_url
-                    )
+        line_bot_api = ApiClientHelper.get_messaging_api()
+        try:
+            line_bot_api.set_webhook_endpoint(
+                SetWebhookEndpointRequest(
+                    endpoint=webhook_url
                 )
-            except ApiException as e:
-                raise ValueError(f"Failed to set webhook URL: {e}")
+            )
+        except ApiException as e:
+            raise ValueError(f"Failed to set webhook URL: {e}")
     
     @staticmethod
     def test_webhook_url():
         """
         測試 LINE Bot 的 Webhook URL 是否有效
         """
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
-            try:
-                return line_bot_api.test_webhook_endpoint().to_dict()
-            except ApiException as e:
-                raise ValueError(f"Webhook URL test failed: {e}")
+        line_bot_api = ApiClientHelper.get_messaging_api()
+        try:
+            return line_bot_api.test_webhook_endpoint().to_dict()
+        except ApiException as e:
+            raise ValueError(f"Webhook URL test failed: {e}")
 
 class RichMenuHelper:
     @staticmethod
@@ -177,51 +324,48 @@ class RichMenuHelper:
         """
         設定圖文選單的圖片
         """
-        with ApiClient(configuration) as api_client:
-            line_bot_blob_api = MessagingApiBlob(api_client)
-            response = requests.get(image_url)
-            if response.status_code != 200:
-                raise ValueError('Invalid image url')
-            else:
-                line_bot_blob_api.set_rich_menu_image(
-                    rich_menu_id=rich_menu_id,
-                    body=response.content,
-                    _headers={'Content-Type': 'image/png'}
-                )
+        line_bot_blob_api = ApiClientHelper.get_messaging_api_blob()
+        response = requests.get(image_url)
+        if response.status_code != 200:
+            raise ValueError('Invalid image url')
+        else:
+            line_bot_blob_api.set_rich_menu_image(
+                rich_menu_id=rich_menu_id,
+                body=response.content,
+                _headers={'Content-Type': 'image/png'}
+            )
 
     @staticmethod
     def create_rich_menu_alias_(alias_id, rich_menu_id):
         """
         建立圖文選單的alias
         """
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
-            line_bot_api.create_rich_menu_alias(
-                CreateRichMenuAliasRequest(
-                    rich_menu_alias_id=alias_id,
-                    rich_menu_id=rich_menu_id
-                )
+        line_bot_api = ApiClientHelper.get_messaging_api()
+        line_bot_api.create_rich_menu_alias(
+            CreateRichMenuAliasRequest(
+                rich_menu_alias_id=alias_id,
+                rich_menu_id=rich_menu_id
             )
+        )
 
     @staticmethod
     def create_rich_menu_(alias_id):
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
-            # 設定 rich menu image
-            rich_menu_str = firebaseService.get_data(
-                DatabaseCollectionMap.RICH_MENU,
-                alias_id
-            ).get('richmenu')
-            rich_menu_id = line_bot_api.create_rich_menu(
-                rich_menu_request=RichMenuRequest.from_json(rich_menu_str)
-            ).rich_menu_id
-            rich_menu_url = firebaseService.get_data(
-                DatabaseCollectionMap.RICH_MENU,
-                alias_id
-            ).get('image_url')
-            __class__.set_rich_menu_image_(rich_menu_id, rich_menu_url)
-            __class__.create_rich_menu_alias_(alias_id, rich_menu_id)
-            return rich_menu_id
+        line_bot_api = ApiClientHelper.get_messaging_api()
+        # 設定 rich menu image
+        rich_menu_str = firebaseService.get_data(
+            DatabaseCollectionMap.RICH_MENU,
+            alias_id
+        ).get('richmenu')
+        rich_menu_id = line_bot_api.create_rich_menu(
+            rich_menu_request=RichMenuRequest.from_json(rich_menu_str)
+        ).rich_menu_id
+        rich_menu_url = firebaseService.get_data(
+            DatabaseCollectionMap.RICH_MENU,
+            alias_id
+        ).get('image_url')
+        __class__.set_rich_menu_image_(rich_menu_id, rich_menu_url)
+        __class__.create_rich_menu_alias_(alias_id, rich_menu_id)
+        return rich_menu_id
 
     #-----------------以下為設定rich menu的程式-----------------
 
@@ -230,12 +374,12 @@ class RichMenuHelper:
         """
         設定rich menu，並將alias id為page1的rich menu設為預設
         """
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
-            richmenus = firebaseService.get_collection_data(DatabaseCollectionMap.RICH_MENU)
+        line_bot_api = ApiClientHelper.get_messaging_api()
+        richmenus = firebaseService.get_collection_data(DatabaseCollectionMap.RICH_MENU)
+        with firebaseService.batch() as batch:
             for richmenu in richmenus:
                 richmenu_id = RichMenuHelper.create_rich_menu_(richmenu.get('alias_id'))
-                firebaseService.update_data(
+                batch.update_data(
                     DatabaseCollectionMap.RICH_MENU,
                     richmenu.get('alias_id'),
                     {'richmenu_id': richmenu_id}
@@ -248,43 +392,42 @@ class RichMenuHelper:
         """
         刪除所有圖文選單和Alias
         """
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
-            richmenu_list = line_bot_api.get_rich_menu_list()
-            richmenu_alias_list = line_bot_api.get_rich_menu_alias_list()
-            for richmenu in richmenu_alias_list.aliases:
-                line_bot_api.delete_rich_menu_alias(richmenu.rich_menu_alias_id)
-            for richmenu in richmenu_list.richmenus:
-                line_bot_api.delete_rich_menu(richmenu.rich_menu_id)
+        line_bot_api = ApiClientHelper.get_messaging_api()
+        richmenu_list = line_bot_api.get_rich_menu_list()
+        richmenu_alias_list = line_bot_api.get_rich_menu_alias_list()
+        for richmenu in richmenu_alias_list.aliases:
+            line_bot_api.delete_rich_menu_alias(richmenu.rich_menu_alias_id)
+        for richmenu in richmenu_list.richmenus:
+            line_bot_api.delete_rich_menu(richmenu.rich_menu_id)
 
     def set_richmenu_by_youtube_level():
         """
         根據YT會員等級設定rich menu
         """
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
-            for level in range(1, 4):
-                user_ids = [
-                    user.get('userId') for user in firebaseService.filter_data(
-                        DatabaseCollectionMap.USER,
-                        [('youtube.level', '==', level)]
-                    )
-                ]
-                if not user_ids:
-                    continue
-
-                rich_menu_id = firebaseService.get_data(
-                    DatabaseCollectionMap.RICH_MENU,
-                    f'page1_level{level}'
-                ).get('richmenu_id')
-
-                # 連結圖文選單到使用者
-                line_bot_api.link_rich_menu_id_to_users(
-                    RichMenuBulkLinkRequest(
-                        rich_menu_id=rich_menu_id,
-                        user_ids=user_ids
-                    )
+        line_bot_api = ApiClientHelper.get_messaging_api()
+        for level in range(1, 4):
+            user_ids = [
+                user.get('userId') for user in firebaseService.filter_data(
+                    DatabaseCollectionMap.USER,
+                    [('youtube.level', '==', level)],
+                    fields=['userId']
+                )
+            ]
+            if not user_ids:
+                continue
+
+            rich_menu_id = firebaseService.get_data(
+                DatabaseCollectionMap.RICH_MENU,
+                f'page1_level{level}'
+            ).get('richmenu_id')
+
+            # 連結圖文選單到使用者
+            line_bot_api.link_rich_menu_id_to_users(
+                RichMenuBulkLinkRequest(
+                    rich_menu_id=rich_menu_id,
+                    user_ids=user_ids
                 )
+            )
 
 #         # 取消圖文選單連結使用者
 #         line_bot_api.unlink_rich_menu_id_from_user("Uxxxxxxx")
@@ -323,23 +466,113 @@ class QuickReplyHelper:
             items=[QuickReplyItem(action=LineBotHelper.create_action(json.loads(item))) for item in quick_reply_data]
         )
     
+class CarouselTemplate:
+    """預先解析的 carousel 模板
+
+    以模板 carousel 的第一個 bubble 作為每個項目的 bubble，解析一次後：
+    - bubble 轉為 CompiledTemplate（文字片段與變數交錯）
+    - carousel 其餘部分拆成 contents 前後兩段文字
+    render 時依序替換每個項目的 bubble 並串接成最終 JSON，不需逐一 json.dumps/json.loads。
+    變數值與 replace_variable 相同，原樣插入 JSON 文字中。
+    """
+    __slots__ = ('bubble', 'head', 'tail', '__weakref__')
+    CONTENTS_SLOT = '__carousel_contents__'
+    # 項目超過 render_carousels 可顯示的數量時，取代最後一個 bubble 的提示
+    MORE_BUBBLE = '{"type":"bubble","body":{"type":"box","layout":"vertical","justifyContent":"center","contents":[{"type":"text","text":%s,"wrap":true,"align":"center","color":"#888888"}]}}'
+    MORE_TEXT = '還有 {count} 筆資料未顯示'
+
+    def __init__(self, line_flex_json: dict):
+        """
+        Args:
+            line_flex_json (dict): carousel 模板，contents[0] 為 bubble 模板
+        """
+        self.bubble = CompiledTemplate(json.dumps(line_flex_json['contents'][0], ensure_ascii=False, separators=(',', ':')))
+        carousel = dict(line_flex_json, contents=CarouselTemplate.CONTENTS_SLOT)
+        self.head, self.tail = json.dumps(carousel, ensure_ascii=False, separators=(',', ':')).split(f'"{CarouselTemplate.CONTENTS_SLOT}"')
+
+    def render_bubbles(self, items: list[dict]) -> list[str]:
+        """Returns
+        list[str]: 各項目替換變數後的 bubble JSON
+        """
+        return self.bubble.render_many(items)
+
+    def wrap(self, bubbles: list[str]) -> RenderedTemplate:
+        """Returns
+        RenderedTemplate: 由 bubble JSON 組成的 carousel JSON
+        """
+        return RenderedTemplate(f'{self.head}[{",".join(bubbles)}]{self.tail}', self)
+
+    def render(self, items: list[dict]) -> str:
+        """Returns
+        str: 根據 items 生成的 carousel JSON
+        """
+        return self.wrap(self.render_bubbles(items))
+
+    def render_carousels(self, items: list[dict], max_carousels: int = FlexValidator.MAX_MESSAGES) -> list[str]:
+        """依 LINE 的限制將 items 分成多個 carousel
+
+        邊替換邊累計大小，超過 bubble 數量（12）或 carousel 大小（50KB）時換下一個 carousel，
+        最多產生 max_carousels 個（單次回覆最多 5 則訊息）。
+        放不下全部項目時記錄警告，並以「還有 N 筆資料未顯示」的提示取代最後一個 bubble
+
+        Returns:
+            list[str]: carousel JSON 列表
+        """
+        wrapper_bytes = len(self.head.encode('utf-8')) + len(self.tail.encode('utf-8')) + 2
+        carousels = []
+        bubbles, size = [], wrapper_bytes
+        for index, item in enumerate(items):
+            bubble = self.bubble.render(item)
+            bubble_bytes = len(bubble.encode('utf-8'))
+            if bubble_bytes > FlexValidator.MAX_BUBBLE_BYTES:
+                raise FlexValidationError(f'contents[{index}]: bubble 大小 {bubble_bytes} bytes 超過 {FlexValidator.MAX_BUBBLE_BYTES} bytes')
+            # bubble 之間的逗號也計入大小
+            if bubbles and (len(bubbles) >= FlexValidator.MAX_BUBBLES or size + 1 + bubble_bytes > FlexValidator.MAX_CAROUSEL_BYTES):
+                if len(carousels) + 1 >= max_carousels:
+                    # 已是最後一個 carousel，剩下的項目放不下
+                    hidden_count = len(items) - index + 1
+                    print(f'render_carousels: {hidden_count} of {len(items)} items exceed {max_carousels} carousels and are not shown')
+                    # 提示 bubble 比任何項目的 bubble 小，取代最後一個 bubble 不會超過大小限制
+                    bubbles[-1] = self.MORE_BUBBLE % json.dumps(self.MORE_TEXT.format(count=hidden_count), ensure_ascii=False)
+                    carousels.append(self.wrap(bubbles))
+                    return carousels
+                carousels.append(self.wrap(bubbles))
+                bubbles, size = [], wrapper_bytes
+            size += bubble_bytes + (1 if bubbles else 0)
+            bubbles.append(bubble)
+        if bubbles:
+            carousels.append(self.wrap(bubbles))
+        return carousels
+
 class FlexMessageHelper:
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def compile_carousel(line_flex_template: str) -> CarouselTemplate:
+        """取得解析後的 carousel 模板（依模板內容快取）
+
+        Args:
+            line_flex_template (str): carousel 模板 JSON 字串
+        """
+        return CarouselTemplate(json.loads(line_flex_template))
+
+    @staticmethod
+    def create_carousel(items: list[dict], line_flex_template: str) -> str:
+        """ Returns 根據 items 生成並替換 carousel bubbles的變數
+        str: carousel JSON 字串，可直接作為 FlexJson 的 contents
+        """
+        return FlexMessageHelper.compile_carousel(line_flex_template).render(items)
+
+    @staticmethod
+    def create_carousels(items: list[dict], line_flex_template: str, max_messages: int = FlexValidator.MAX_MESSAGES) -> list[str]:
+        """ Returns 根據 items 生成 carousel，超過 LINE 的 bubble 數量或大小限制時自動分成多個
+        list[str]: carousel JSON 字串列表（最多 max_messages 個，放不下的項目以最後一個 bubble 提示未顯示的筆數）；
+            items 為空時回傳空列表，呼叫端需自行回覆沒有資料的訊息（LINE 不接受 0 則訊息的回覆）
+        """
+        return FlexMessageHelper.compile_carousel(line_flex_template).render_carousels(items, max_messages)
+
     @staticmethod
     def create_carousel_bubbles(items: list[dict], line_flex_json: json):
         """ Returns 根據 items 生成並替換 carousel bubbles的變數
         json: carousel bubbles
         """
-        bubbles = []
-        for item in items:
-            # 複製原始的 bubble
-            new_bubble = line_flex_json['contents'][0].copy()
-            # 在新 bubble 中進行變數替換
-            new_bubble = replace_variable(json.dumps(new_bubble), item)
-            
-            # 將新 bubble 添加到 bubbles 中
-            bubbles.append(json.loads(new_bubble))
-        
-        # 將生成的 bubbles 放回 line_flex_json 中
-        line_flex_json['contents'] = bubbles
-
-        return line_flex_json
\ No newline at end of file
+        return json.loads(CarouselTemplate(line_flex_json).render(items))
@@ -0,0 +1,498 @@
+from google.cloud.firestore_v1.transforms import Increment, DELETE_FIELD
+from map import DatabaseCollectionMap
+from utils.metrics import firestore_metrics
+from datetime import datetime
+from functools import wraps
+import threading
+import copy
+import json
+import time
+
+def simulate_latency(func):
+    """依 latency_ms 設定延遲，模擬 Firestore 的網路往返"""
+    @wraps(func)
+    def wrapper(service, *args, **kwargs):
+        if service.latency_ms:
+            time.sleep(service.latency_ms / 1000)
+        return func(service, *args, **kwargs)
+    return wrapper
+
+class MemoryDocumentSnapshot:
+    """模擬 DocumentSnapshot"""
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self.exists else None
+
+class MemoryCollectionReference:
+    """模擬 CollectionReference（僅提供 id）"""
+    def __init__(self, collection):
+        self.id = collection
+
+class MemoryDocumentReference:
+    """模擬 DocumentReference"""
+    def __init__(self, service, collection, doc_id):
+        self._service = service
+        self.parent = MemoryCollectionReference(collection)
+        self.id = str(doc_id)
+        self.path = f'{collection}/{self.id}'
+
+    def get(self):
+        return MemoryDocumentSnapshot(self, self._service._store.get(self.parent.id, {}).get(self.id))
+
+    def __deepcopy__(self, memo):
+        # 參考本身不可變，複製資料時共用同一個物件
+        return self
+
+    def __eq__(self, other):
+        return isinstance(other, MemoryDocumentReference) and self.path == other.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+class MemoryFireBaseBatch:
+    """批次寫入，於 commit 時一次套用所有操作"""
+    def __init__(self, service):
+        self._service = service
+        self._operations = []
+
+    def add_data(self, collection, doc_id, data, ref_fields=None):
+        self._operations.append(('set', collection, doc_id, self._service._process_ref_fields(data, ref_fields, operation='add')))
+
+    def update_data(self, collection, doc_id, data, ref_fields=None):
+        self._operations.append(('update', collection, doc_id, self._service._process_ref_fields(data, ref_fields, operation='add')))
+
+    def merge_data(self, collection, doc_id, data):
+        self._operations.append(('merge', collection, doc_id, data))
+
+    def delete_data(self, collection, doc_id):
+        self._operations.append(('delete', collection, doc_id, None))
+
+    @simulate_latency
+    def commit(self):
+        if not self._operations:
+            return
+        collections = ','.join(sorted({operation[1] for operation in self._operations}))
+        with firestore_metrics.track('commit', collections) as record:
+            with self._service._lock:
+                # 先檢查所有更新的文件都存在，確保全部成功或全部失敗
+                for operation, collection, doc_id, _ in self._operations:
+                    if operation == 'update' and str(doc_id) not in self._service._store.get(collection, {}):
+                        raise KeyError(f'No document to update: {collection}/{doc_id}')
+                for operation, collection, doc_id, data in self._operations:
+                    self._service._write(operation, collection, doc_id, data)
+            record['documents'] = len(self._operations)
+        self._operations = []
+
+    @property
+    def latency_ms(self):
+        return self._service.latency_ms
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        return False
+
+class MemoryFireBaseService:
+    """
+    FireBaseService 的記憶體版本，用於離線測試與效能分析
+
+    資料以 {collection: {doc_id: data}} 存放於記憶體，可由 JSON fixture 載入，
+    並可設定每次操作的模擬延遲。fixture 中的特殊值：
+        {"__datetime__": "2024-01-01T00:00:00+08:00"}  -> datetime
+        {"__ref__": "courses/1"}                        -> DocumentReference
+    """
+    def __init__(self, fixtures=None, latency_ms=0):
+        self.latency_ms = latency_ms
+        self._store = {}
+        self._listeners = {}
+        self._lock = threading.RLock()
+        if fixtures:
+            self.load_fixtures(fixtures)
+
+    # ----------------fixture----------------
+
+    def load_fixtures(self, fixtures):
+        """載入 fixture
+
+        Args:
+            fixtures (str | dict): JSON 檔案路徑或 {collection: {doc_id: data}}
+        """
+        if isinstance(fixtures, str):
+            with open(fixtures, encoding='utf-8') as f:
+                fixtures = json.load(f)
+        with self._lock:
+            for collection, docs in fixtures.items():
+                self._store.setdefault(collection, {}).update({
+                    str(doc_id): self._decode(data) for doc_id, data in docs.items()
+                })
+
+    def dump_fixtures(self):
+        """Returns
+        dict: 目前資料的 fixture 格式，可用 json.dump 存檔
+        """
+        with self._lock:
+            return {
+                collection: {doc_id: self._encode(data) for doc_id, data in docs.items()}
+                for collection, docs in self._store.items()
+            }
+
+    def _decode(self, value):
+        if isinstance(value, dict):
+            if set(value) == {'__datetime__'}:
+                return datetime.fromisoformat(value['__datetime__'])
+            if set(value) == {'__ref__'}:
+                collection, doc_id = value['__ref__'].split('/', 1)
+                return MemoryDocumentReference(self, collection, doc_id)
+            return {key: self._decode(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._decode(item) for item in value]
+        return value
+
+    def _encode(self, value):
+        if isinstance(value, datetime):
+            return {'__datetime__': value.isoformat()}
+        if isinstance(value, MemoryDocumentReference):
+            return {'__ref__': value.path}
+        if isinstance(value, dict):
+            return {key: self._encode(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._encode(item) for item in value]
+        return value
+
+    # ----------------內部工具----------------
+
+    @staticmethod
+    def _get_field(data, field):
+        """取得欄位值，支援 'a.b' 巢狀欄位
+
+        Returns:
+            tuple: (是否存在, 值)
+        """
+        value = data
+        for key in field.split('.'):
+            if not isinstance(value, dict) or key not in value:
+                return False, None
+            value = value[key]
+        return True, value
+
+    @staticmethod
+    def _compare(operator, value, target):
+        """Returns
+        bool: 是否符合篩選條件
+        """
+        try:
+            match operator:
+                case '==':
+                    return value == target
+                case '!=':
+                    return value != target and value is not None
+                case '<':
+                    return value < target
+                case '<=':
+                    return value <= target
+                case '>':
+                    return value > target
+                case '>=':
+                    return value >= target
+                case 'in':
+                    return value in target
+                case 'not-in':
+                    return value not in target and value is not None
+                case 'array_contains' | 'array-contains':
+                    return isinstance(value, list) and target in value
+                case 'array_contains_any' | 'array-contains-any':
+                    return isinstance(value, list) and any(item in value for item in target)
+        except TypeError:
+            # 型別不同的值無法比較，視為不符合
+            return False
+        raise ValueError(f'Unsupported operator: {operator}')
+
+    def _query(self, collection, conditions=None, order_by=None, limit=None):
+        """Returns
+        list: 符合條件的 (doc_id, data) 列表
+        """
+        docs = list(self._store.get(collection, {}).items())
+        for field, operator, target in conditions or []:
+            matched = []
+            for doc_id, data in docs:
+                exists, value = self._get_field(data, field)
+                if exists and self._compare(operator, value, target):
+                    matched.append((doc_id, data))
+            docs = matched
+        if order_by:
+            field, direction = order_by[0], order_by[1] if len(order_by) > 1 else 'asc'
+            # Firestore 排序時會排除沒有該欄位的文件
+            docs = [(doc_id, data) for doc_id, data in docs if self._get_field(data, field)[0]]
+            docs.sort(key=lambda doc: self._get_field(doc[1], field)[1], reverse=direction == 'desc')
+        if limit:
+            docs = docs[:limit]
+        return docs
+
+    @staticmethod
+    def _project(data, fields):
+        if not fields:
+            return copy.deepcopy(data)
+        projected = {}
+        for field in fields:
+            exists, value = MemoryFireBaseService._get_field(data, field)
+            if exists:
+                target = projected
+                keys = field.split('.')
+                for key in keys[:-1]:
+                    target = target.setdefault(key, {})
+                target[keys[-1]] = copy.deepcopy(value)
+        return projected
+
+    def _to_dict_list(self, docs, ref_fields=None, fields=None):
+        result = [{'doc_id': doc_id, **self._project(data, fields)} for doc_id, data in docs]
+        if ref_fields:
+            for doc_data in result:
+                for field in ref_fields:
+                    ref = doc_data.get(field)
+                    if isinstance(ref, MemoryDocumentReference):
+                        ref_doc = ref.get()
+                        if ref_doc.exists:
+                            doc_data[field] = ref_doc.to_dict()
+                            doc_data[f'{field}_id'] = ref.id
+        return result
+
+    def _process_ref_fields(self, data, ref_fields, operation='add'):
+        """處理參考欄位（參數同 FireBaseService._process_ref_fields）"""
+        processed_data = dict(data)
+        if not ref_fields:
+            return processed_data
+        for field_name, target_collection in ref_fields.items():
+            if field_name in processed_data and processed_data[field_name]:
+                if operation == 'add':
+                    processed_data[field_name] = MemoryDocumentReference(self, target_collection, processed_data[field_name])
+                elif operation == 'get':
+                    ref = processed_data[field_name]
+                    if isinstance(ref, MemoryDocumentReference):
+                        ref_doc = ref.get()
+                        if ref_doc.exists:
+                            processed_data[field_name] = ref_doc.to_dict()
+                            processed_data[f'{field_name}_id'] = ref.id
+        return processed_data
+
+    def _resolve_value(self, current, value):
+        """套用 Increment 等轉換"""
+        if isinstance(value, Increment):
+            return (current if isinstance(current, (int, float)) else 0) + value.value
+        return copy.deepcopy(value)
+
+    def _write(self, operation, collection, doc_id, data):
+        """實際寫入資料（呼叫端需持有 _lock）"""
+        docs = self._store.setdefault(collection, {})
+        doc_id = str(doc_id)
+        change_type = 'MODIFIED' if doc_id in docs else 'ADDED'
+        if operation == 'set':
+            docs[doc_id] = {key: self._resolve_value(None, value) for key, value in data.items()}
+        elif operation == 'update':
+            if doc_id not in docs:
+                raise KeyError(f'No document to update: {collection}/{doc_id}')
+            doc = docs[doc_id]
+            for field, value in data.items():
+                # update 的 'a.b' 代表巢狀欄位
+                target = doc
+                keys = field.split('.')
+                for key in keys[:-1]:
+                    target = target.setdefault(key, {})
+                if value is DELETE_FIELD:
+                    target.pop(keys[-1], None)
+                else:
+                    target[keys[-1]] = self._resolve_value(target.get(keys[-1]), value)
+        elif operation == 'merge':
+            self._merge(docs.setdefault(doc_id, {}), data)
+        elif operation == 'delete':
+            if docs.pop(doc_id, None) is None:
+                return
+            change_type = 'REMOVED'
+        self._notify(collection, doc_id, change_type)
+
+    def _merge(self, target, data):
+        """將 data 逐欄合併至 target，巢狀 dict 遞迴合併（同 set merge=True）"""
+        for key, value in data.items():
+            if isinstance(value, dict):
+                if not isinstance(target.get(key), dict):
+                    target[key] = {}
+                self._merge(target[key], value)
+            else:
+                target[key] = self._resolve_value(target.get(key), value)
+
+    def _notify(self, collection, doc_id, change_type):
+        """通知監聽該集合的 callback"""
+        data = self._store.get(collection, {}).get(doc_id)
+        for callback in self._listeners.get(collection, []):
+            callback(change_type, doc_id, copy.deepcopy(data))
+
+    # ----------------FireBaseService 介面----------------
+
+    @firestore_metrics.instrument('list_collections')
+    @simulate_latency
+    def list_collections(self):
+        """取得所有 collection 名稱"""
+        with self._lock:
+            return [collection for collection, docs in self._store.items() if docs]
+
+    @firestore_metrics.instrument('query')
+    @simulate_latency
+    def get_collection_data(self, collection, order_by=None, ref_fields=None, fields=None):
+        """取得集合所有資料"""
+        with self._lock:
+            return self._to_dict_list(self._query(collection, order_by=order_by), ref_fields, fields)
+
+    @firestore_metrics.instrument('get')
+    @simulate_latency
+    def get_data(self, collection, doc_id, ref_fields=None):
+        """取得資料"""
+        with self._lock:
+            data = self._store.get(collection, {}).get(str(doc_id))
+            if data is None:
+                return None
+            data = copy.deepcopy(data)
+            if ref_fields:
+                return self._process_ref_fields(data, ref_fields, operation='get')
+            return data
+
+    @firestore_metrics.instrument('get_all')
+    @simulate_latency
+    def get_multiple_data(self, collection, doc_ids, ref_fields=None):
+        """批次取得多筆資料"""
+        with self._lock:
+            docs = self._store.get(collection, {})
+            return self._to_dict_list(
+                [(str(doc_id), docs[str(doc_id)]) for doc_id in dict.fromkeys(doc_ids) if str(doc_id) in docs],
+                ref_fields
+            )
+
+    @firestore_metrics.instrument('query')
+    @simulate_latency
+    def filter_data(self, collection, conditions, order_by=None, limit=None, ref_fields=None, fields=None):
+        """篩選資料"""
+        with self._lock:
+            return self._to_dict_list(self._query(collection, conditions, order_by, limit), ref_fields, fields)
+
+    @firestore_metrics.instrument('query')
+    @simulate_latency
+    def page(self, collection, page_size, start_after=None, conditions=None, fields=None):
+        """以游標分頁取得集合資料（依文件ID排序）"""
+        with self._lock:
+            docs = sorted(self._query(collection, conditions), key=lambda doc: doc[0])
+            if start_after:
+                docs = [(doc_id, data) for doc_id, data in docs if doc_id > start_after]
+            docs = self._to_dict_list(docs[:page_size], fields=fields)
+        next_cursor = docs[-1]['doc_id'] if len(docs) == page_size else None
+        return docs, next_cursor
+
+    def iter_collection(self, collection, page_size=500, start_after=None, conditions=None, fields=None):
+        """逐頁串流集合資料"""
+        cursor = start_after
+        while True:
+            docs, cursor = self.page(collection, page_size, start_after=cursor, conditions=conditions, fields=fields)
+            yield from docs
+            if not cursor:
+                return
+
+    @firestore_metrics.instrument('count')
+    @simulate_latency
+    def get_aggregate_count(self, collection, conditions):
+        """取得collection經過條件篩選後的總筆數"""
+        with self._lock:
+            return len(self._query(collection, conditions))
+
+    @firestore_metrics.instrument('set', documents=1)
+    @simulate_latency
+    def add_data(self, collection, doc_id, data, ref_fields=None):
+        """新增資料"""
+        processed_data = self._process_ref_fields(data, ref_fields, operation='add')
+        with self._lock:
+            self._write('set', collection, doc_id, processed_data)
+
+    @firestore_metrics.instrument('create', documents=1)
+    @simulate_latency
+    def create_data(self, collection, doc_id, data) -> bool:
+        """新增資料，文件已存在時不覆寫並回傳 False"""
+        with self._lock:
+            if str(doc_id) in self._store.get(collection, {}):
+                return False
+            self._write('set', collection, doc_id, data)
+            return True
+
+    @firestore_metrics.instrument('update', documents=1)
+    @simulate_latency
+    def update_data(self, collection, doc_id, data, ref_fields=None):
+        """更新資料"""
+        processed_data = self._process_ref_fields(data, ref_fields, operation='add')
+        with self._lock:
+            self._write('update', collection, doc_id, processed_data)
+
+    @firestore_metrics.instrument('delete', documents=1)
+    @simulate_latency
+    def delete_data(self, collection, doc_id):
+        """刪除資料"""
+        with self._lock:
+            self._write('delete', collection, doc_id, None)
+
+    @firestore_metrics.instrument('transaction')
+    @simulate_latency
+    def next_id(self, collection, id_field='id'):
+        """取得集合的下一個流水號"""
+        with self._lock:
+            counters = self._store.setdefault(DatabaseCollectionMap.COUNTER, {})
+            counter = counters.get(collection)
+            if counter:
+                current_id = counter['value']
+            else:
+                docs = self._query(collection, order_by=(id_field, 'desc'), limit=1)
+                current_id = docs[0][1].get(id_field, 0) if docs else 0
+            counters[collection] = {'value': current_id + 1}
+            return current_id + 1
+
+    @staticmethod
+    def increment(value=1):
+        """Returns
+        Increment: 原子遞增，可作為 add_data/update_data 的欄位值
+        """
+        return Increment(value)
+
+    @staticmethod
+    def delete_field():
+        """Returns
+        Sentinel: 刪除欄位，可作為 update_data 的欄位值
+        """
+        return DELETE_FIELD
+
+    def batch(self):
+        """Returns
+        MemoryFireBaseBatch: 批次寫入物件
+        """
+        return MemoryFireBaseBatch(self)
+
+    def cache_collection(self, collection):
+        """資料已在記憶體中，不需另外建立快取"""
+        return
+
+    def wait_cache_ready(self, collection, timeout=None):
+        """資料已在記憶體中，永遠為已同步"""
+        return True
+
+    def get_cached_data(self, collection, doc_id):
+        """從記憶體取得資料（不模擬延遲）"""
+        with self._lock:
+            data = self._store.get(collection, {}).get(str(doc_id))
+            return copy.deepcopy(data) if data is not None else None
+
+    def on_snapshot(self, collection, callback):
+        """監聽集合變更（參數同 FireBaseService.on_snapshot）"""
+        with self._lock:
+            self._listeners.setdefault(collection, []).append(callback)
+            for doc_id, data in self._store.get(collection, {}).items():
+                callback('ADDED', doc_id, copy.deepcopy(data))
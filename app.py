@@ -1,9 +1,10 @@
 from map import DatabaseCollectionMap
-from flask import Flask, render_template, flash, redirect, url_for
+from flask import Flask, render_template, flash, redirect, url_for, request, g
 from linebot_app import linebot_app
 from liff_app import liff_app
 from admin_app import admin_app
 from config import get_config
+from utils.metrics import firestore_metrics
 
 config = get_config()
 firebaseservice = config.firebaseService
@@ -13,6 +14,22 @@ app.register_blueprint(linebot_app)
 app.register_blueprint(liff_app, url_prefix='/liff')
 app.register_blueprint(admin_app, url_prefix='/admin')
 
+@app.before_request
+def start_firestore_metrics():
+    g.firestore_metrics_token = firestore_metrics.start_request()
+
+@app.teardown_request
+def log_firestore_metrics(exception=None):
+    token = g.pop('firestore_metrics_token', None)
+    if token is None:
+        return
+    summary = firestore_metrics.end_request(token)
+    if summary['operations']:
+        app.logger.info(
+            f"Firestore {request.method} {request.path}: "
+            f"{summary['operations']} ops, {summary['documents']} docs, {summary['elapsed_ms']} ms"
+        )
+
 @app.route('/')
 def index():
     news_items = firebaseservice.filter_data(DatabaseCollectionMap.NEWS, [('is_active', '==', True)])
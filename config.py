@@ -10,7 +10,8 @@ import json
 # import pygsheets
 # from api.spreadsheet import SpreadsheetService
 from api.firebase import FireBaseService
-from map import FeatureStatus
+from utils.response_cache import ResponseCache
+from map import FeatureStatus, DatabaseCollectionMap
 
 class Singleton(type):
     _instances = {}
@@ -38,6 +39,28 @@ class Config(metaclass=Singleton):
         self.LIFF_ID_TALL = os.getenv('LIFF_ID_TALL')
         self.LIFF_ID_FULL = os.getenv('LIFF_ID_FULL')
         self.LIFF_ID_ADMIN = os.getenv('LIFF_ID_ADMIN')
+        # 資料庫後端：firestore（預設）或 memory（離線測試／效能分析用）
+        self.FIREBASE_BACKEND = os.getenv('FIREBASE_BACKEND', 'firestore')
+        self.FIREBASE_FIXTURES = os.getenv('FIREBASE_FIXTURES')
+        self.FIREBASE_LATENCY_MS = float(os.getenv('FIREBASE_LATENCY_MS', 0))
+        # LINE Messaging API 共用連線池的連線數
+        self.LINE_API_POOL_SIZE = int(os.getenv('LINE_API_POOL_SIZE', 10))
+        # 回覆前的訊息格式檢查：local（預設，本地檢查）、remote（呼叫 validate_reply，除錯用）、off
+        self.FLEX_VALIDATION_MODE = os.getenv('FLEX_VALIDATION_MODE', 'local')
+        # Webhook 事件處理方式：sync（預設，於請求中處理）或 async（立即回應，交由背景 worker 處理）
+        # 無法在回應後執行背景工作的環境（如 serverless）請維持 sync
+        self.WEBHOOK_DISPATCH_MODE = os.getenv('WEBHOOK_DISPATCH_MODE', 'sync')
+        self.WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 4))
+        self.WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', 100))
+        self.WEBHOOK_ENQUEUE_TIMEOUT = float(os.getenv('WEBHOOK_ENQUEUE_TIMEOUT', 1))
+        # 佇列已滿且該使用者仍有事件在佇列中時，最多再等待的秒數（逾時回應 503 由 LINE 重送）
+        self.WEBHOOK_ORDERED_ENQUEUE_TIMEOUT = float(os.getenv('WEBHOOK_ORDERED_ENQUEUE_TIMEOUT', 5))
+        # 重送事件去重：memory（預設，程序內 LRU）、firestore（跨程序／實例共用）、off
+        self.WEBHOOK_DEDUP_BACKEND = os.getenv('WEBHOOK_DEDUP_BACKEND', 'memory')
+        self.WEBHOOK_DEDUP_TTL = int(os.getenv('WEBHOOK_DEDUP_TTL', 3600))
+        self.WEBHOOK_DEDUP_SIZE = int(os.getenv('WEBHOOK_DEDUP_SIZE', 10000))
+        # 已產生回覆內容（Flex JSON）的快取數量
+        self.RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 256))
 
     def _check_required_env_vars(self):
         """檢查必要的環境變數"""
@@ -46,6 +69,8 @@ class Config(metaclass=Singleton):
             'SPREADSHEET_URL', 'FIREBASE_CREDENTIALS', 'LIFF_ID_COMPACT',
             'LIFF_ID_TALL', 'LIFF_ID_FULL', 'LIFF_ID_ADMIN'
         ]
+        if self.FIREBASE_BACKEND == 'memory':
+            required_vars.remove('FIREBASE_CREDENTIALS')
         
         missing_vars = [var for var in required_vars if getattr(self, var) is None]
         
@@ -57,8 +82,17 @@ class Config(metaclass=Singleton):
         """初始化LINE Bot相關物件"""
         self.handler = WebhookHandler(self.CHANNEL_SECRET)
         self.configuration = Configuration(access_token=self.CHANNEL_ACCESS_TOKEN)
+        self.configuration.connection_pool_maxsize = self.LINE_API_POOL_SIZE
         # self.spreadsheetService = SpreadsheetService(pygsheets.authorize(service_account_env_var='GDRIVE_API_CREDENTIALS'), self.SPREADSHEET_URL)
-        self.firebaseService = FireBaseService(json.loads(self.FIREBASE_CREDENTIALS))
+        if self.FIREBASE_BACKEND == 'memory':
+            from api.memory_firebase import MemoryFireBaseService
+            self.firebaseService = MemoryFireBaseService(self.FIREBASE_FIXTURES, self.FIREBASE_LATENCY_MS)
+        else:
+            self.firebaseService = FireBaseService(json.loads(self.FIREBASE_CREDENTIALS))
+        # 預先載入 Line Flex 模板及系統設定快取，避免每個事件都讀取 Firestore
+        self.firebaseService.cache_collection(DatabaseCollectionMap.LINE_FLEX)
+        self.firebaseService.cache_collection(DatabaseCollectionMap.CONFIG)
+        self.responseCache = ResponseCache(self.firebaseService, self.RESPONSE_CACHE_SIZE)
     
     def _initialize_features(self):
         """初始化功能狀態"""
@@ -2,10 +2,12 @@ from abc import ABC, abstractmethod
 from typing import Dict, Type, Optional
 from config import Config, get_config
 from api.firebase import FireBaseService
+from utils.response_cache import ResponseCache
 
 class Feature(ABC):
     config: Config = get_config()
     firebaseService: FireBaseService = config.firebaseService
+    responseCache: ResponseCache = config.responseCache
 
     @abstractmethod
     def execute_message(self, event, **kwargs):
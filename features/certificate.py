@@ -1,11 +1,9 @@
 from .base import Feature, register_feature
 from linebot.v3.messaging import (
-    FlexMessage,
-    FlexContainer,
     ImageMessage
 )
 from map import DatabaseCollectionMap
-from api.linebot_helper import LineBotHelper
+from api.linebot_helper import LineBotHelper, FlexJson
 
 @register_feature('certificate')
 class Certificate(Feature):
@@ -13,11 +11,11 @@ class Certificate(Feature):
     證書申請流程
     """
     def execute_message(self, event, **kwargs):
-        line_flex_str = self.firebaseService.get_data(
+        line_flex_str = self.firebaseService.get_cached_data(
             DatabaseCollectionMap.LINE_FLEX,
             "certificate"
         ).get('summary')
-        return LineBotHelper.reply_message(event, [FlexMessage(alt_text='證書申請流程', contents=FlexContainer.from_json(line_flex_str))])
+        return LineBotHelper.reply_message(event, [FlexJson(alt_text='證書申請流程', contents=line_flex_str)])
 
     def execute_postback(self, event, **kwargs):
         params = kwargs.get('params')
@@ -1,11 +1,9 @@
 from .base import Feature, register_feature
 from linebot.v3.messaging import (
-    FlexMessage,
-    FlexContainer
+    TextMessage
 )
 from map import DatabaseCollectionMap
-from api.linebot_helper import LineBotHelper, FlexMessageHelper
-import json
+from api.linebot_helper import LineBotHelper, FlexMessageHelper, FlexJson
 
 @register_feature('community')
 class Community(Feature):
@@ -13,18 +11,33 @@ class Community(Feature):
     社群學習資源
     """
     def execute_message(self, event, **kwargs):
-        line_flex_str = self.firebaseService.get_data(
+        line_flex_str = self.firebaseService.get_cached_data(
             DatabaseCollectionMap.LINE_FLEX,
             "community"
         ).get("summary")
-        return LineBotHelper.reply_message(event, [FlexMessage(alt_text='社群學習資源', contents=FlexContainer.from_json(line_flex_str))])
+        return LineBotHelper.reply_message(event, [FlexJson(alt_text='社群學習資源', contents=line_flex_str)])
 
     def execute_postback(self, event, **kwargs):
+        # 所有使用者相同的內容，於資料變更前直接使用快取
+        line_flex_strs = self.responseCache.get_or_render(
+            'community',
+            ('microcourse',),
+            [DatabaseCollectionMap.MICROCOURSE, DatabaseCollectionMap.LINE_FLEX],
+            self.__render_microcourses
+        )
+        if not line_flex_strs:
+            # 沒有微課程時 carousel 為空，改以文字回覆
+            return LineBotHelper.reply_message(event, [TextMessage(text='目前沒有微課程資料')])
+        return LineBotHelper.reply_message(event, [FlexJson(alt_text='社群學習資源', contents=line_flex_str) for line_flex_str in line_flex_strs])
+
+    def __render_microcourses(self):
+        """Returns
+        list[str]: 微課程的 carousel JSON
+        """
         microcourses = self.firebaseService.get_collection_data(DatabaseCollectionMap.MICROCOURSE)
-        line_flex_template = self.firebaseService.get_data(
+        line_flex_template = self.firebaseService.get_cached_data(
             DatabaseCollectionMap.LINE_FLEX,
             "community"
         ).get("microcourse")
-        line_flex_json = FlexMessageHelper.create_carousel_bubbles(microcourses, json.loads(line_flex_template))
-        line_flex_str = json.dumps(line_flex_json)
-        return LineBotHelper.reply_message(event, [FlexMessage(alt_text='社群學習資源', contents=FlexContainer.from_json(line_flex_str))])
\ No newline at end of file
+        # 微課程過多時最後一個 bubble 改為提示未顯示的筆數
+        return FlexMessageHelper.create_carousels(microcourses, line_flex_template)
\ No newline at end of file
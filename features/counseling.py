@@ -1,10 +1,6 @@
 from .base import Feature, register_feature
-from linebot.v3.messaging import (
-    FlexMessage,
-    FlexContainer
-)
 from map import DatabaseCollectionMap
-from api.linebot_helper import LineBotHelper
+from api.linebot_helper import LineBotHelper, FlexJson
 
 @register_feature('counseling')
 class Counseling(Feature):
@@ -12,11 +8,11 @@ class Counseling(Feature):
     課程諮詢建議
     """
     def execute_message(self, event, **kwargs):
-        line_flex_str = self.firebaseService.get_data(
+        line_flex_str = self.firebaseService.get_cached_data(
             DatabaseCollectionMap.LINE_FLEX,
             "counseling"
         ).get('select')
-        return LineBotHelper.reply_message(event, [FlexMessage(alt_text='課程諮詢/建議', contents=FlexContainer.from_json(line_flex_str))])
+        return LineBotHelper.reply_message(event, [FlexJson(alt_text='課程諮詢/建議', contents=line_flex_str)])
 
     def execute_postback(self, event, **kwargs):
         pass
\ No newline at end of file
@@ -1,14 +1,10 @@
 from .base import Feature, register_feature
-from utils.utils import replace_variable
+from utils.utils import replace_variable, compile_template
 from linebot.v3.messaging import (
-    TextMessage,
-    FlexMessage,
-    FlexContainer
+    TextMessage
 )
-from api.linebot_helper import LineBotHelper, QuickReplyHelper, FlexMessageHelper
+from api.linebot_helper import LineBotHelper, QuickReplyHelper, FlexMessageHelper, FlexJson
 from map import DatabaseCollectionMap
-import json
-import math
 
 @register_feature('course')
 class Course(Feature):
@@ -16,11 +12,11 @@ class Course(Feature):
     開課修業查詢
     """
     def execute_message(self, event, **kwargs):
-        line_flex_str = self.firebaseService.get_data(
+        line_flex_str = self.firebaseService.get_cached_data(
             DatabaseCollectionMap.LINE_FLEX,
             "course"
         ).get("select")
-        return LineBotHelper.reply_message(event, [FlexMessage(alt_text='開課時間查詢', contents=FlexContainer.from_json(line_flex_str))])
+        return LineBotHelper.reply_message(event, [FlexJson(alt_text='開課時間查詢', contents=line_flex_str)])
 
     def execute_postback(self, event, **kwargs):
         params = kwargs.get('params')
@@ -48,20 +44,21 @@ class Course(Feature):
             course_records = self.__process_courses_with_study_records(courses, user_courses)
 
             # 取得line flex template以及替換修課資料變數
-            line_flex_template = self.firebaseService.get_data(
+            line_flex_template = self.firebaseService.get_cached_data(
                 DatabaseCollectionMap.LINE_FLEX,
                 "course"
             ).get('progress')
+            variable_dict = {}
             for course_record in course_records:
                 course_id = course_record['course_id']
-                variable_dict = { f"{key}{course_id}": course_record[key] for key in ['status', 'category', 'semester', 'color'] }
-                line_flex_template = replace_variable(line_flex_template, variable_dict)
+                variable_dict.update({ f"{key}{course_id}": course_record[key] for key in ['status', 'category', 'semester', 'color'] })
 
             # 建立替換學分數據的字典
             credits_summary = self.__calculate_credits_summary(course_records)
 
-            line_flex_str = replace_variable(line_flex_template, credits_summary)
-            return LineBotHelper.reply_message(event, [FlexMessage(alt_text='修課進度', contents=FlexContainer.from_json(line_flex_str))])
+            # 各課程及學分數據一次替換
+            line_flex_str = compile_template(line_flex_template).render(variable_dict, credits_summary)
+            return LineBotHelper.reply_message(event, [FlexJson(alt_text='修課進度', contents=line_flex_str)])
             
         else:
             course_record_id = params.get('course_record')
@@ -70,14 +67,15 @@ class Course(Feature):
             # 如果有course_record_id，則回傳該課程的詳細資訊
             if course_record_id:
                 course_record = self.firebaseService.filter_data(DatabaseCollectionMap.COURSE_OPEN, [('id', '==', int(course_record_id))], ref_fields=['course'])[0]
-                course = self.firebaseService.filter_data(DatabaseCollectionMap.COURSE, [('course_id', '==', course_record['course'].get('course_id'))])[0]
+                # course 參考欄位已解構為課程資料，不需再查詢一次
+                course = dict(course_record['course'])
                 course.update(course_record)
-                line_flex_template = self.firebaseService.get_data(
+                line_flex_template = self.firebaseService.get_cached_data(
                     DatabaseCollectionMap.LINE_FLEX,
                     "course"
                 ).get('detail')
-                line_flex_str = replace_variable(line_flex_template, course)
-                return LineBotHelper.reply_message(event, [FlexMessage(alt_text='詳細說明', contents=FlexContainer.from_json(line_flex_str))])
+                line_flex_str = compile_template(line_flex_template).render(course)
+                return LineBotHelper.reply_message(event, [FlexJson(alt_text='詳細說明', contents=line_flex_str)])
             
             # 否則如果有course_category，則回傳該類別的課程資訊
             elif course_category:
@@ -90,29 +88,18 @@ class Course(Feature):
                 # 拆解學年和學期
                 year = params.get('semester')[:3]
                 semester = params.get('semester')[3:]
-                course_records = self.firebaseService.filter_data(DatabaseCollectionMap.COURSE_OPEN, [('year', '==', year), ('semester', '==', semester)], ref_fields=['course'])
-                for record in course_records:
-                    course = self.firebaseService.filter_data(DatabaseCollectionMap.COURSE, [('course_id', '==', int(record['course'].get('course_id')))])[0]
-                    record.update(course)
-                if course_category != 'overview':
-                    course_records = [record for record in course_records if record.get('category') == course_map.get(course_category)]
-                if len(course_records) == 0:
+                # 所有使用者相同的內容，於課程資料變更前直接使用快取
+                line_flex_strs = self.responseCache.get_or_render(
+                    'course',
+                    ('summary', year, semester, course_category),
+                    [DatabaseCollectionMap.COURSE_OPEN, DatabaseCollectionMap.COURSE, DatabaseCollectionMap.LINE_FLEX],
+                    lambda: self.__render_course_summary(year, semester, course_map.get(course_category) if course_category != 'overview' else None)
+                )
+                if len(line_flex_strs) == 0:
                     message = f'{year}學年度第{semester}學期沒有{course_map.get(course_category)}課程資料'
                     return LineBotHelper.reply_message(event, [TextMessage(text=message)])
                 else:
-                    line_flex_template = self.firebaseService.get_data(
-                        DatabaseCollectionMap.LINE_FLEX, 
-                        "course"
-                    ).get('summary')
-
-                    bubble_amount = 12
-                    flex_message_bubbles = []
-                    for i in range(math.ceil(len(course_records) / bubble_amount)):
-                        temp = course_records[i*bubble_amount:i*bubble_amount+bubble_amount] if i*bubble_amount+bubble_amount < len(course_records) else course_records[i*bubble_amount:]
-                        line_flex_json = FlexMessageHelper.create_carousel_bubbles(temp, json.loads(line_flex_template))
-                        line_flex_str = json.dumps(line_flex_json)
-                        flex_message_bubbles.append(FlexContainer.from_json(line_flex_str))
-                    return LineBotHelper.reply_message(event, [FlexMessage(alt_text=course_map.get(course_category), contents=flex) for flex in flex_message_bubbles])
+                    return LineBotHelper.reply_message(event, [FlexJson(alt_text=course_map.get(course_category), contents=line_flex_str) for line_flex_str in line_flex_strs])
             
             # 否則回傳課程類別的快速回覆選項
             else:
@@ -124,6 +111,24 @@ class Course(Feature):
                     quick_reply_data.get('actions')[i] = replace_variable(text, params)
                 return LineBotHelper.reply_message(event, [TextMessage(text=quick_reply_data.get('text'), quick_reply=QuickReplyHelper.create_quick_reply(quick_reply_data.get('actions')))])
     
+    def __render_course_summary(self, year: str, semester: str, category: str = None):
+        """Returns
+        list[str]: 該學期（類別）開課資訊的 carousel JSON，沒有課程時為空列表
+        """
+        course_records = self.firebaseService.filter_data(DatabaseCollectionMap.COURSE_OPEN, [('year', '==', year), ('semester', '==', semester)], ref_fields=['course'])
+        for record in course_records:
+            record.update(record['course'])
+        if category:
+            course_records = [record for record in course_records if record.get('category') == category]
+        if len(course_records) == 0:
+            return []
+        line_flex_template = self.firebaseService.get_cached_data(
+            DatabaseCollectionMap.LINE_FLEX, 
+            "course"
+        ).get('summary')
+        # 依 bubble 數量及大小限制自動分成多個 carousel，超過 5 則時最後一個 bubble 提示未顯示的筆數
+        return FlexMessageHelper.create_carousels(course_records, line_flex_template)
+
     def __get_study_status(self, course_dict):
         """Returns
         Tuple: (修課狀態, 修課狀態顏色)
@@ -155,10 +160,19 @@ class Course(Feature):
         
         # 建立課程記錄的字典
         course_records_dict = {}
+        # 一次批次取得所有修課記錄對應的開課記錄
+        open_records = self.firebaseService.get_multiple_data(
+            DatabaseCollectionMap.COURSE_OPEN,
+            [user_course['record_id'] for user_course in user_courses],
+            ref_fields=['course']
+        )
+        open_records_dict = {record['doc_id']: record for record in open_records}
         for user_course in user_courses:
             record_id = user_course['record_id']
-            course_record = self.firebaseService.get_data(DatabaseCollectionMap.COURSE_OPEN, str(record_id), ref_fields={'course': DatabaseCollectionMap.COURSE})
-            if course_record and course_record['course']:
+            course_record = open_records_dict.get(str(record_id))
+            if course_record and isinstance(course_record.get('course'), dict):
+                # 同一筆開課記錄可能對應多筆修課記錄，複製後再合併
+                course_record = dict(course_record)
                 course_id = course_record['course'].get('course_id')
                 # 如果同課程有多筆記錄，保留最新的（id 最大的）
                 if course_id not in course_records_dict or course_record['id'] > course_records_dict[course_id]['id']:
@@ -1,13 +1,10 @@
 from .base import Feature, register_feature
 from utils.utils import *
 from map import DatabaseCollectionMap, EquipmentStatus, LIFF
-from api.linebot_helper import LineBotHelper, FlexMessageHelper
+from api.linebot_helper import LineBotHelper, FlexMessageHelper, FlexJson
 from linebot.v3.messaging import (
-    TextMessage,
-    FlexMessage,
-    FlexContainer
+    TextMessage
 )
-import json
 
 @register_feature('equipment')
 class Equipment(Feature):
@@ -15,13 +12,13 @@ class Equipment(Feature):
     設備租借
     """
     def execute_message(self, event, **kwargs):
-        line_flex_str = self.firebaseService.get_data(
+        line_flex_str = self.firebaseService.get_cached_data(
             DatabaseCollectionMap.LINE_FLEX,
             "equipment"
         ).get("select")
         rent_url = f'https://liff.line.me/{LIFF.TALL.value}/rent?userId={event.source.user_id}'
-        line_flex_str = replace_variable(line_flex_str, {'rent_url': rent_url})
-        return LineBotHelper.reply_message(event, [FlexMessage(alt_text='設備租借', contents=FlexContainer.from_json(line_flex_str))])
+        line_flex_str = compile_template(line_flex_str).render({'rent_url': rent_url})
+        return LineBotHelper.reply_message(event, [FlexJson(alt_text='設備租借', contents=line_flex_str)])
 
     def execute_postback(self, event, **kwargs):
         params = kwargs.get('params')
@@ -34,18 +31,20 @@ class Equipment(Feature):
                 return LineBotHelper.reply_message(event, [TextMessage(text='此租借申請已審核過')])
             # 使用者回覆設備租借核准
             if decision == '1':
-                # 設備租借核准
-                borrower_id = self.__rent_equipment(borrower_info)
-                self.firebaseService.delete_data(DatabaseCollectionMap.TEMP, borrower_user_id)
+                # 設備租借核准（更新設備狀態與刪除TEMP一起批次寫入）
+                with self.firebaseService.batch() as batch:
+                    borrower_id = self.__rent_equipment(batch, borrower_info)
+                    batch.delete_data(DatabaseCollectionMap.TEMP, borrower_user_id)
                 borrow_records = self.__get_borrow_records(borrower_user_id, borrower_id)
-                line_flex_template = self.firebaseService.get_data(
+                line_flex_template = self.firebaseService.get_cached_data(
                     DatabaseCollectionMap.LINE_FLEX,
                     "equipment"
                 ).get("record")
-                line_flex_json = FlexMessageHelper.create_carousel_bubbles(borrow_records, json.loads(line_flex_template))
-                line_flex_str = json.dumps(line_flex_json)
-                LineBotHelper.reply_message(event, [TextMessage(text='設備租借核准'), FlexMessage(alt_text='借用清單', contents=FlexContainer.from_json(line_flex_str))])
-                LineBotHelper.push_message(borrower_user_id, [TextMessage(text='設備租借核准'), FlexMessage(alt_text='借用清單', contents=FlexContainer.from_json(line_flex_str))])
+                # 文字訊息佔一則，carousel 最多 4 則（放不下的紀錄以最後一個 bubble 提示筆數）
+                line_flex_strs = FlexMessageHelper.create_carousels(borrow_records, line_flex_template, max_messages=4)
+                messages = [TextMessage(text='設備租借核准')] + [FlexJson(alt_text='借用清單', contents=line_flex_str) for line_flex_str in line_flex_strs]
+                LineBotHelper.reply_message(event, messages)
+                LineBotHelper.push_message(borrower_user_id, messages)
                 return
             else:
                 # 設備租借不核准
@@ -60,16 +59,16 @@ class Equipment(Feature):
                 borrow_records = self.__get_borrow_records(user_id)
                 if len(borrow_records) == 0:
                     return LineBotHelper.reply_message(event, [TextMessage(text='您目前沒有借用任何設備')])
-                line_flex_template = self.firebaseService.get_data(
+                line_flex_template = self.firebaseService.get_cached_data(
                     DatabaseCollectionMap.LINE_FLEX,
                     "equipment"
                 ).get("record")
-                line_flex_json = FlexMessageHelper.create_carousel_bubbles(borrow_records, json.loads(line_flex_template))
-                line_flex_str = json.dumps(line_flex_json)
-                return LineBotHelper.reply_message(event, [FlexMessage(alt_text='借用清單', contents=FlexContainer.from_json(line_flex_str))])
+                # 借用紀錄過多時只顯示前 5 則 carousel，最後一個 bubble 提示其餘筆數
+                line_flex_strs = FlexMessageHelper.create_carousels(borrow_records, line_flex_template)
+                return LineBotHelper.reply_message(event, [FlexJson(alt_text='借用清單', contents=line_flex_str) for line_flex_str in line_flex_strs])
 
-    def __rent_equipment(self, params: dict):
-        """租借設備(更新資料庫)
+    def __rent_equipment(self, batch, params: dict):
+        """租借設備(更新資料庫，寫入操作排入 batch)
         Returns
         str: 借用者id
         """
@@ -95,7 +94,7 @@ class Equipment(Feature):
         rent_amount = int(params.pop('equipmentAmount'))
         # 更新設備狀態
         for equipment in equipment_status_data[:rent_amount]:
-            self.firebaseService.update_data(DatabaseCollectionMap.EQUIPMENT, equipment.get('_id'), params)
+            batch.update_data(DatabaseCollectionMap.EQUIPMENT, equipment.get('_id'), params)
         return borrower_id
     
     def __get_borrow_records(self, user_id: str, borrower_id: str=None):
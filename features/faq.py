@@ -1,12 +1,9 @@
 from .base import Feature, register_feature
 from linebot.v3.messaging import (
-    TextMessage,
-    FlexMessage,
-    FlexContainer
+    TextMessage
 )
 from map import DatabaseCollectionMap
-from api.linebot_helper import LineBotHelper, FlexMessageHelper
-import json
+from api.linebot_helper import LineBotHelper, FlexMessageHelper, FlexJson
 
 @register_feature('faq')
 class FAQ(Feature):
@@ -15,24 +12,52 @@ class FAQ(Feature):
     """
     def execute_message(self, event, **kwargs):
         user_msg = event.message.text
+        # 所有使用者相同的內容，於資料變更前直接使用快取
         if user_msg == "常見問答":
-            faqs = self.firebaseService.get_collection_data(DatabaseCollectionMap.FAQ)
-            for faq in faqs:
-                faq['action_text'] = faq['category']
-            line_flex_template = self.firebaseService.get_data(
-                DatabaseCollectionMap.LINE_FLEX,
-                "faq"
-            ).get("select")
+            line_flex_strs = self.responseCache.get_or_render(
+                'faq',
+                ('select',),
+                [DatabaseCollectionMap.FAQ, DatabaseCollectionMap.LINE_FLEX],
+                self.__render_select
+            )
         else:
-            faq_questions = self.firebaseService.get_collection_data(DatabaseCollectionMap.FAQ_QUESTION)
-            faqs = [faq for faq in faq_questions if faq['category'] in user_msg]
-            line_flex_template = self.firebaseService.get_data(
-                DatabaseCollectionMap.LINE_FLEX,
-                "faq"
-            ).get("question")
-        line_flex_json = FlexMessageHelper.create_carousel_bubbles(faqs, json.loads(line_flex_template))
-        line_flex_str = json.dumps(line_flex_json)
-        return LineBotHelper.reply_message(event, [FlexMessage(alt_text='常見問答', contents=FlexContainer.from_json(line_flex_str))])
+            line_flex_strs = self.responseCache.get_or_render(
+                'faq',
+                ('question', user_msg),
+                [DatabaseCollectionMap.FAQ_QUESTION, DatabaseCollectionMap.LINE_FLEX],
+                lambda: self.__render_questions(user_msg)
+            )
+        if not line_flex_strs:
+            # 沒有問答資料時 carousel 為空，改以文字回覆
+            return LineBotHelper.reply_message(event, [TextMessage(text='目前沒有相關的問答資料')])
+        return LineBotHelper.reply_message(event, [FlexJson(alt_text='常見問答', contents=line_flex_str) for line_flex_str in line_flex_strs])
+
+    def __render_select(self):
+        """Returns
+        list[str]: 問答類別的 carousel JSON
+        """
+        faqs = self.firebaseService.get_collection_data(DatabaseCollectionMap.FAQ)
+        for faq in faqs:
+            faq['action_text'] = faq['category']
+        line_flex_template = self.firebaseService.get_cached_data(
+            DatabaseCollectionMap.LINE_FLEX,
+            "faq"
+        ).get("select")
+        # 問答超過 5 則 carousel 的部分不顯示，最後一個 bubble 提示未顯示的筆數
+        return FlexMessageHelper.create_carousels(faqs, line_flex_template)
+
+    def __render_questions(self, user_msg: str):
+        """Returns
+        list[str]: 該類別問題的 carousel JSON
+        """
+        faq_questions = self.firebaseService.get_collection_data(DatabaseCollectionMap.FAQ_QUESTION)
+        faqs = [faq for faq in faq_questions if faq['category'] in user_msg]
+        line_flex_template = self.firebaseService.get_cached_data(
+            DatabaseCollectionMap.LINE_FLEX,
+            "faq"
+        ).get("question")
+        # 問答超過 5 則 carousel 的部分不顯示，最後一個 bubble 提示未顯示的筆數
+        return FlexMessageHelper.create_carousels(faqs, line_flex_template)
 
     def execute_postback(self, event, **kwargs):
         params = kwargs.get('params')
@@ -1,10 +1,6 @@
 from .base import Feature, register_feature
-from linebot.v3.messaging import (
-    FlexMessage,
-    FlexContainer
-)
 from map import DatabaseCollectionMap
-from api.linebot_helper import LineBotHelper
+from api.linebot_helper import LineBotHelper, FlexJson
 
 @register_feature('menu')
 class Menu(Feature):
@@ -12,11 +8,11 @@ class Menu(Feature):
     主選單
     """
     def execute_message(self, event, **kwargs):
-        line_flex_str = self.firebaseService.get_data(
+        line_flex_str = self.firebaseService.get_cached_data(
             DatabaseCollectionMap.LINE_FLEX,
             "menu"
         ).get("main")
-        return LineBotHelper.reply_message(event, [FlexMessage(alt_text='主選單', contents=FlexContainer.from_json(line_flex_str))])
+        return LineBotHelper.reply_message(event, [FlexJson(alt_text='主選單', contents=line_flex_str)])
         
 
     def execute_postback(self, event, **kwargs):
@@ -1,17 +1,16 @@
 from .base import Feature, register_feature
 from map import DatabaseCollectionMap, LIFF
 from utils.utils import *
-from api.linebot_helper import LineBotHelper, FlexMessageHelper
+from api.linebot_helper import LineBotHelper, FlexMessageHelper, FlexJson
+from utils.quiz_pool import QuizQuestionPool
+from utils.leaderboard import Leaderboard, CompetitionLeaderboards
+from utils.score_histogram import ScoreHistograms
 from linebot.v3.messaging import (
-    TextMessage,
-    FlexMessage,
-    FlexContainer
+    TextMessage
 )
 import pandas as pd
-import json
 import random
 import pytz
-from datetime import datetime
 
 @register_feature('quiz')
 class Quiz(Feature):
@@ -20,12 +19,18 @@ class Quiz(Feature):
     """
     gold_star_url = "https://scdn.line-apps.com/n/channel_devcenter/img/fx/review_gold_star_28.png"
     gray_star_url = "https://scdn.line-apps.com/n/channel_devcenter/img/fx/review_gray_star_28.png"
+    # 各類別題目保存在記憶體中，抽題及歷史題目皆由此取得
+    questionPool = QuizQuestionPool(Feature.firebaseService)
+    # 各競賽排行榜保存在記憶體中，完成競賽時逐筆更新
+    leaderboards = CompetitionLeaderboards(Feature.firebaseService)
+    # 各類別答對題數分布保存在記憶體中，用於計算擊敗比例
+    scoreHistograms = ScoreHistograms(Feature.firebaseService)
     def execute_message(self, event, **kwargs):
-        line_flex_str = self.firebaseService.get_data(
+        line_flex_str = self.firebaseService.get_cached_data(
             DatabaseCollectionMap.LINE_FLEX,
             "quiz"
         ).get('start')
-        return LineBotHelper.reply_message(event, [FlexMessage(alt_text='知識測驗', contents=FlexContainer.from_json(line_flex_str))])
+        return LineBotHelper.reply_message(event, [FlexJson(alt_text='知識測驗', contents=line_flex_str)])
 
     def execute_postback(self, event, **kwargs):
         params = kwargs.get('params')
@@ -33,7 +38,7 @@ class Quiz(Feature):
         question_no = params.get('no')
         if question_no:
             question_no = int(question_no)
-            # 從temp取得題目
+            # 從temp取得測驗進度（題目ID、目前題號及答對題數）
             temp_data = self.firebaseService.get_data(DatabaseCollectionMap.TEMP, user_id)
             quiz_id = params.get('quiz_id')
             
@@ -50,41 +55,47 @@ class Quiz(Feature):
             if competition_id and not self.__check_competition_open_time(competition_id):
                 return LineBotHelper.reply_message(event, [TextMessage(text='該競賽已結束!')])
             
-            quiz_questions = temp_data.get('questions')
-            
             # 使用者的答案
             answer = params.get('answer').lower()
 
             # 判斷答案是否正確
-            last_quiz_question = quiz_questions[question_no - 1]
+            last_quiz_question = self.__get_session_question(temp_data, question_no - 1)
+            next_quiz_question = self.__get_session_question(temp_data, question_no) if question_no < temp_data.get('question_amount') else {}
+            if last_quiz_question is None or next_quiz_question is None:
+                # 題目在測驗中途被刪除，無法繼續作答
+                self.firebaseService.delete_data(DatabaseCollectionMap.TEMP, user_id)
+                return LineBotHelper.reply_message(event, [TextMessage(text='測驗題目已被更新，本次測驗已結束，請重新開始測驗！')])
             is_correct = answer == last_quiz_question.get('answer').lower()
             answer_line_flex_str = self.__generate_answer_line_flex(last_quiz_question, is_correct)
 
-            # 記錄該題作答(選擇的答案人數+1)
-            self.__create_answer_record(temp_data.get('mode'), user_id, temp_data.get('quiz_id'), last_quiz_question, answer)
+            # 記錄該題作答(選擇的答案人數+1)，與TEMP的更新一起批次寫入
+            batch = self.firebaseService.batch()
+            answer_time = self.__create_answer_record(batch, temp_data.get('mode'), user_id, temp_data.get('quiz_id'), last_quiz_question, answer)
             if is_correct:
                 temp_data['correct_amount'] += 1
 
             if question_no < temp_data.get('question_amount'):
-                question_line_flex_str = self.__generate_question_line_flex(quiz_questions[question_no], quiz_id, question_no, temp_data.get('question_amount'))
-                self.firebaseService.update_data(DatabaseCollectionMap.TEMP, user_id, {'no': question_no + 1, 'correct_amount': temp_data.get('correct_amount')})
+                question_line_flex_str = self.__generate_question_line_flex(next_quiz_question, quiz_id, question_no, temp_data.get('question_amount'))
+                batch.update_data(DatabaseCollectionMap.TEMP, user_id, {'no': question_no + 1, 'correct_amount': temp_data.get('correct_amount')})
+                batch.commit()
                 return LineBotHelper.reply_message(event, [
-                    FlexMessage(alt_text='測驗解答', contents=FlexContainer.from_json(answer_line_flex_str)),
-                    FlexMessage(alt_text='測驗題目', contents=FlexContainer.from_json(question_line_flex_str))
+                    FlexJson(alt_text='測驗解答', contents=answer_line_flex_str),
+                    FlexJson(alt_text='測驗題目', contents=question_line_flex_str)
                 ])
             else:
-                # 生成測驗結果
+                # 最後一題，測驗結果與作答紀錄、TEMP 的刪除一起批次寫入，寫入失敗時 TEMP 仍保留
+                batch.delete_data(DatabaseCollectionMap.TEMP, user_id)
+                # 生成測驗結果（最後一題的作答時間即為測驗結束時間）
                 mode = temp_data.get('mode')
                 if mode == 'general':
                     # 一般模式                    
-                    result_line_flex_str = self.__generate_general_quiz_result(user_id, temp_data)
+                    result_line_flex_str = self.__generate_general_quiz_result(batch, user_id, temp_data)
                 else:
                     # 競賽模式
-                    result_line_flex_str = self.__generate_competition_quiz_result(user_id, temp_data)
-                self.firebaseService.delete_data(DatabaseCollectionMap.TEMP, user_id)
+                    result_line_flex_str = self.__generate_competition_quiz_result(batch, user_id, temp_data, answer_time)
                 return LineBotHelper.reply_message(event, [
-                    FlexMessage(alt_text='測驗解答', contents=FlexContainer.from_json(answer_line_flex_str)),
-                    FlexMessage(alt_text='測驗結果', contents=FlexContainer.from_json(result_line_flex_str))
+                    FlexJson(alt_text='測驗解答', contents=answer_line_flex_str),
+                    FlexJson(alt_text='測驗結果', contents=result_line_flex_str)
                 ])
         else:
             # 進行測驗
@@ -98,7 +109,7 @@ class Quiz(Feature):
             if mode == 'rank':
                 # 排行榜
                 rank_line_flex_str = self.__generate_rank_line_flex(competition_id, user_id)
-                return LineBotHelper.reply_message(event, [FlexMessage(alt_text='排行榜', contents=FlexContainer.from_json(rank_line_flex_str))])
+                return LineBotHelper.reply_message(event, [FlexJson(alt_text='排行榜', contents=rank_line_flex_str)])
             elif mode == 'history' and not question_id:
                 if type == 'user':
                     return self.__generate_personal_history_question(event, category, user_id)
@@ -111,13 +122,13 @@ class Quiz(Feature):
 
             elif mode == 'competition_rule':
                 # 測驗說明
-                line_flex_str = self.firebaseService.get_data(
+                line_flex_str = self.firebaseService.get_cached_data(
                     DatabaseCollectionMap.LINE_FLEX,
                     "quiz"
                 ).get('competition_rule')
                 userinfo_url = f'https://liff.line.me/{LIFF.TALL.value}/userinfo?userId={user_id}'
-                line_flex_json = replace_variable(line_flex_str, {'category': category, 'competition_id': competition_id, 'userinfo_url': userinfo_url})
-                return LineBotHelper.reply_message(event, [FlexMessage(alt_text='測驗說明', contents=FlexContainer.from_json(line_flex_json))])
+                line_flex_json = compile_template(line_flex_str).render({'category': category, 'competition_id': competition_id, 'userinfo_url': userinfo_url})
+                return LineBotHelper.reply_message(event, [FlexJson(alt_text='測驗說明', contents=line_flex_json)])
             if category:
                 quiz_id = generate_id()
                 current_time = get_current_time()
@@ -156,16 +167,17 @@ class Quiz(Feature):
                 quiz_flex_data = [quiz for quiz in quiz_flex_datas if quiz.get('enable') and quiz.get('mode') == mode and quiz.get('category') == category][0]
                 question_amount = quiz_flex_data.get('question_amount')
                 database_amount = quiz_flex_data.get('database_amount')
-                quiz_questions = random.sample(self.firebaseService.filter_data(DatabaseCollectionMap.QUIZ_QUESTION, [('category', '==', category), ('is_competition', '==', False)]) , database_amount)
-                quiz_questions.extend(random.sample(self.firebaseService.filter_data(DatabaseCollectionMap.QUIZ_QUESTION, [('category', '==', category), ('is_competition', '==', True)]), question_amount - database_amount))
+                quiz_questions = self.questionPool.sample(category, False, database_amount)
+                quiz_questions.extend(self.questionPool.sample(category, True, question_amount - database_amount))
                 random.shuffle(quiz_questions)
+                # TEMP 只存題目 ID，題目內容於作答時由題庫取得
                 data = {
                     'task': 'quiz',
                     'mode': mode,
                     'competition_id': competition_id,
                     'category': category,
                     'no': 1,
-                    'questions': quiz_questions,
+                    'question_ids': [question.get('id') for question in quiz_questions],
                     'question_amount': question_amount,
                     'correct_amount': 0,
                     'quiz_id': quiz_id,
@@ -174,9 +186,9 @@ class Quiz(Feature):
                 self.firebaseService.add_data(DatabaseCollectionMap.TEMP, user_id, data)
 
                 line_flex_str = self.__generate_question_line_flex(quiz_questions[0], quiz_id, 0, question_amount)
-                return LineBotHelper.reply_message(event, [FlexMessage(alt_text='測驗題目', contents=FlexContainer.from_json(line_flex_str))])
+                return LineBotHelper.reply_message(event, [FlexJson(alt_text='測驗題目', contents=line_flex_str)])
             else:
-                line_flex_data = self.firebaseService.get_data(
+                line_flex_data = self.firebaseService.get_cached_data(
                     DatabaseCollectionMap.LINE_FLEX,
                     "quiz"
                 )
@@ -191,9 +203,19 @@ class Quiz(Feature):
                     for quiz in quiz_flex_data:
                         quiz['start_time'] = quiz.get('start_time').astimezone(taiwan_tz).strftime('%Y-%m-%d %H:%M') if quiz.get('start_time') else '無期限'
                         quiz['end_time'] = quiz.get('end_time').astimezone(taiwan_tz).strftime('%Y-%m-%d %H:%M') if quiz.get('end_time') else '無期限'
-                    line_flex_json = FlexMessageHelper.create_carousel_bubbles(quiz_flex_data, json.loads(line_flex_template))
-                    return LineBotHelper.reply_message(event, [FlexMessage(alt_text='選擇測驗類別', contents=FlexContainer.from_json(json.dumps(line_flex_json)))])
+                    # 測驗超過 5 則 carousel 可顯示的數量時，最後一個 bubble 提示未顯示的筆數
+                    line_flex_strs = FlexMessageHelper.create_carousels(quiz_flex_data, line_flex_template)
+                    return LineBotHelper.reply_message(event, [FlexJson(alt_text='選擇測驗類別', contents=line_flex_str) for line_flex_str in line_flex_strs])
     
+    def __get_session_question(self, temp_data: dict, index: int):
+        """Returns
+        dict: 測驗中第 index 題（從 0 開始）的題目資料，題目已被刪除時為 None
+        """
+        if 'question_ids' in temp_data:
+            return self.questionPool.get(temp_data['question_ids'][index])
+        # 舊格式的 TEMP 保存完整題目
+        return temp_data['questions'][index]
+
     def __generate_question_line_flex(self, question: dict, quiz_id: str, question_no: int, question_amount: int):
         """Returns
         生成題目的Line Flex
@@ -204,23 +226,24 @@ class Quiz(Feature):
             'width': round((100 / question_amount) * question_no)
         })
 
-        line_flex_quiz = self.firebaseService.get_data(
+        line_flex_quiz = self.firebaseService.get_cached_data(
             DatabaseCollectionMap.LINE_FLEX,
             "quiz"
         )
         line_flex_str = line_flex_quiz.get('question_with_image') if question.get('image_url') else line_flex_quiz.get('question')
-        line_flex_str = replace_variable(line_flex_str, question)
-        # 生成星星
+        # 題目資料及星星（前 difficulty 顆為金色，其餘為灰色）一次替換
         difficulty = int(question.get('difficulty'))
-        line_flex_str = replace_variable(line_flex_str, {"star_url": self.gold_star_url}, difficulty)
-        line_flex_str = replace_variable(line_flex_str, {"star_url": self.gray_star_url}, 5 - difficulty)
-        return line_flex_str
+        return compile_template(line_flex_str).render(
+            question,
+            ({"star_url": self.gold_star_url}, difficulty),
+            ({"star_url": self.gray_star_url}, 5 - difficulty)
+        )
     
     def __generate_answer_line_flex(self, question: dict, is_correct: bool):
         """Returns
         生成答案的Line Flex
         """
-        line_flex_quiz = self.firebaseService.get_data(
+        line_flex_quiz = self.firebaseService.get_cached_data(
             DatabaseCollectionMap.LINE_FLEX,
             "quiz"
         )
@@ -234,12 +257,16 @@ class Quiz(Feature):
         question.update({
             'correct_rate': correct_rate
         })
-        line_flex_str = replace_variable(line_flex_str, question)
+        line_flex_str = compile_template(line_flex_str).render(question)
         return line_flex_str
 
-    def __create_answer_record(self, mode: str, user_id: str, quiz_id: str, question: dict, answer: str):
+    def __create_answer_record(self, batch, mode: str, user_id: str, quiz_id: str, question: dict, answer: str):
         """
         記錄該題作答(選擇的答案人數+1)以及個別題目記錄到quiz_records(個人的答題紀錄)
+        寫入操作排入 batch，由呼叫端 commit
+
+        Returns:
+            datetime: 作答時間
         """
         # 更新該題作答人數(quiz_questions)
         column_map = {
@@ -249,14 +276,17 @@ class Quiz(Feature):
             'd': 'D_vote_count'
         }
         column_name = column_map.get(answer)
-        self.firebaseService.update_data(
+        is_correct = answer == question.get('answer').lower()
+        # 計數欄位以伺服器端 Increment 累加，避免同時作答互相覆蓋；
+        # correct_rate 由題庫讀取時依計數計算，不另外寫入
+        increment = self.firebaseService.increment
+        batch.update_data(
             DatabaseCollectionMap.QUIZ_QUESTION,
             str(question.get('id')),
             {
-                column_name: question.get(column_name) + 1,
-                'total_count': question.get('total_count') + 1,
-                'correct_count': question.get('correct_count') + 1 if answer == question.get('answer').lower() else question.get('correct_count'),
-                'wrong_count': question.get('wrong_count') + 1 if answer != question.get('answer').lower() else question.get('wrong_count')
+                column_name: increment(1),
+                'total_count': increment(1),
+                'correct_count' if is_correct else 'wrong_count': increment(1)
             }
         )
 
@@ -264,7 +294,7 @@ class Quiz(Feature):
         question_id = question.get('id')
         taiwan_tz = pytz.timezone('Asia/Taipei')
         event_time = get_current_time().astimezone(taiwan_tz)
-        self.firebaseService.add_data(
+        batch.add_data(
             DatabaseCollectionMap.QUIZ_RECORD,
             generate_id(),
             {
@@ -276,72 +306,97 @@ class Quiz(Feature):
                 'timestamp': event_time
             }
         )
+        return event_time
 
-    def __generate_general_quiz_result(self, user_id: str, params: dict):
+    def __generate_general_quiz_result(self, batch, user_id: str, params: dict):
         """
         生成測驗結果，並記錄整個quiz結果到quiz_log(個人的測驗紀錄)
+        quiz_log 排入 batch 並與呼叫端排入的寫入一起 commit
         """
         correct_amount = params.get('correct_amount')
+        category = params.get('category')
         # 個別測驗紀錄正確率在quiz_log中
         quiz_id = params.get('quiz_id')
-        self.firebaseService.add_data(
+        batch.add_data(
             DatabaseCollectionMap.QUIZ_LOG,
             quiz_id,
             {
                 'quiz_id': quiz_id,
                 'user_id': user_id,
+                'category': category,
                 'correct_amount': correct_amount,
                 'question_amount': params.get('question_amount')
             }
         )
-        defeat_count = self.firebaseService.get_aggregate_count(DatabaseCollectionMap.QUIZ_LOG, [('correct_amount', '<', correct_amount)])
-        total_count = self.firebaseService.get_aggregate_count(DatabaseCollectionMap.QUIZ_LOG, [('correct_amount', '>=', 0)])
-        defeat_rate = round((defeat_count / total_count)*100, 2) if correct_amount > 0 else 0
+        # 擊敗比例由記憶體中的答對題數分布計算（寫入前計算，總人數含本次），分布的遞增與 quiz_log 一起寫入
+        defeat_rate = self.scoreHistograms.defeat_rate(category, correct_amount)
+        self.scoreHistograms.record(batch, category, correct_amount)
+        batch.commit()
+        if defeat_rate is None:
+            # 分布尚未同步時查詢同類別的 quiz_log（需 category + correct_amount 複合索引），與分布的計算範圍相同
+            defeat_count = self.firebaseService.get_aggregate_count(DatabaseCollectionMap.QUIZ_LOG, [('category', '==', category), ('correct_amount', '<', correct_amount)])
+            total_count = self.firebaseService.get_aggregate_count(DatabaseCollectionMap.QUIZ_LOG, [('category', '==', category)])
+            defeat_rate = round((defeat_count / total_count)*100, 2)
+        defeat_rate = defeat_rate if correct_amount > 0 else 0
         params.update({'defeat_rate': defeat_rate})
         
         # 產生測驗結果line flex
-        line_flex_str = self.firebaseService.get_data(
+        line_flex_str = self.firebaseService.get_cached_data(
             DatabaseCollectionMap.LINE_FLEX,
             "quiz"
         ).get('general_result')
-        line_flex_str = replace_variable(line_flex_str, params)
+        line_flex_str = compile_template(line_flex_str).render(params)
         return line_flex_str
     
-    def __generate_competition_quiz_result(self, user_id: str, params: dict):
+    def __generate_competition_quiz_result(self, batch, user_id: str, params: dict, end_time):
         """
         生成測驗結果，並記錄整個quiz結果到compitition(個人的競賽測驗紀錄)
+        competitions 的更新排入 batch 並與呼叫端排入的寫入一起 commit
+
+        Args:
+            end_time (datetime): 測驗結束時間（最後一題的作答時間）
         """
         correct_amount = params.get('correct_amount')
-        quiz_records = self.firebaseService.filter_data(DatabaseCollectionMap.QUIZ_RECORD, [('quiz_id', '==', params.get('quiz_id'))], ('timestamp', 'asc'))
         
         # 測驗開始與結束時間計算
         start_time = params.get('start_time')
-        end_time = quiz_records[-1].get('timestamp')
         spend_time = end_time - start_time
         spend_time_str = convert_timedelta_to_string(spend_time)
+        # 以毫秒保存時間，並合成可直接排序的排名鍵
+        time_ms = int(spend_time.total_seconds() * 1000)
         
         # 紀錄測驗結果資料
-        self.firebaseService.update_data(
+        result = {
+            'end_time': end_time,
+            'time_spent': spend_time_str,
+            'time_ms': time_ms,
+            'rank_key': Leaderboard.make_rank_key(correct_amount, time_ms),
+            'correct_amount': correct_amount,
+            'question_amount': params.get('question_amount')
+        }
+        batch.update_data(
             DatabaseCollectionMap.COMPETITION,
             params.get('quiz_id'),
-            {
-                'end_time': end_time,
-                'time_spent': spend_time_str,
-                'correct_amount': correct_amount,
-                'question_amount': params.get('question_amount')
-            }
+            result
+        )
+        batch.commit()
+
+        # 更新排行榜
+        user_info = self.firebaseService.get_data(DatabaseCollectionMap.USER, user_id)
+        self.leaderboards.record(
+            params.get('competition_id'),
+            self.leaderboards.create_entry(dict(result, user_id=user_id, quiz_id=params.get('quiz_id')), user_info)
         )
         
         # 產生結果line flex
-        line_flex_str = self.firebaseService.get_data(
+        line_flex_str = self.firebaseService.get_cached_data(
             DatabaseCollectionMap.LINE_FLEX,
             "quiz"
         ).get('competition_result')
         hours, minutes, seconds = spend_time_str.split(':')
-        user_info = self.firebaseService.get_data(DatabaseCollectionMap.USER, user_id)
         user_picture_url = user_info.get('pictureUrl')
         params.update({'hours': hours, 'minutes': minutes, 'seconds': seconds, 'user_picture_url': user_picture_url})
-        line_flex_str = replace_variable(line_flex_str, params)
+        line_flex_str = compile_template(line_flex_str).render(params)
         return line_flex_str
     
     def __check_competition_open_time(self, competition_id: str):
@@ -393,56 +448,40 @@ class Quiz(Feature):
                 display_name = display_name[0] + '**' + display_name[-1]
             return display_name
 
+        # 前五名及使用者名次由排行榜取得
+        competitions = self.leaderboards.top(competition_id, 5)
+        user_competition = self.leaderboards.get(competition_id, user_id)
         user_info = self.firebaseService.get_data(DatabaseCollectionMap.USER, user_id)
-        competitions = self.firebaseService.filter_data(DatabaseCollectionMap.COMPETITION, [('competition_id', '==', competition_id), ('time_spent', '!=', '')])
-        data = {}
-        if len(competitions) == 0:
-            # 還未有人參賽
+        if user_competition is None:
+            # 使用者未參賽（或還未有人參賽）
             data = get_user_data(user_info, user_id)
         else:
-            competition_df = pd.DataFrame(competitions)
-
-            # 依照正確率、答題時間排序進行排名
-            competition_df['rank'] = competition_df[['correct_amount', 'time_spent']].apply(
-                lambda x: (-x['correct_amount'], x['time_spent']), axis=1
-            ).rank(method='min').astype(int)
-            competition_df = competition_df.sort_values(by='rank', ascending=True, ignore_index=True)
-            competitions = competition_df.to_dict(orient='records')[:5]
-            user_competition = [competition for competition in competitions if competition.get('user_id') == user_id]
-            
-            if len(user_competition) == 0:
-                # 使用者未參賽
-                data = get_user_data(user_info, user_id)
-            else:
-                # 使用者已參賽
-                user_competition = user_competition[0]
-                user_info = self.firebaseService.get_data(DatabaseCollectionMap.USER, user_id)
-                user_time_spent = format_time_spent_str(user_competition.get('time_spent'))
-                data = {
-                    'mode': 'competition',
-                    'user_display_name': user_info.get('displayName'),
-                    'user_picture_url': user_info.get('pictureUrl'),
-                    'user_rank': user_competition.get('rank'),
-                    'user_correct_rate': round(int(user_competition.get('correct_amount')) / int(user_competition.get('question_amount')) * 100),
-                    'user_time_spent': user_time_spent,
-                }
+            # 使用者已參賽
+            user_time_spent = format_time_spent_str(user_competition.get('time_spent'))
+            data = {
+                'mode': 'competition',
+                'user_display_name': user_info.get('displayName'),
+                'user_picture_url': user_info.get('pictureUrl'),
+                'user_rank': user_competition.get('rank'),
+                'user_correct_rate': round(int(user_competition.get('correct_amount')) / int(user_competition.get('question_amount')) * 100),
+                'user_time_spent': user_time_spent,
+            }
 
-        line_flex_str = self.firebaseService.get_data(
+        line_flex_str = self.firebaseService.get_cached_data(
             DatabaseCollectionMap.LINE_FLEX,
             "quiz"
         ).get('rank')
-        line_flex_str = replace_variable(line_flex_str, data)
+        layers = [data]
 
-        # 生成排行榜前5名
+        # 生成排行榜前5名（每位使用者只替換一組排名欄位）
         for i in range(5):
             # 若前五名有資料則顯示，否則顯示'-'
             if len(competitions) >= i + 1:
-                user_info = self.firebaseService.get_data(DatabaseCollectionMap.USER, competitions[i].get('user_id'))
+                # 排行榜已保存使用者名稱與頭像，不需再讀取 users
                 competitions[i]['correct_rate'] = round(int(competitions[i].get('correct_amount')) / int(competitions[i].get('question_amount')) * 100)
-                competitions[i]['displayName'] = generate_mask(user_info.get('displayName'))
-                competitions[i]['pictureUrl'] = user_info.get('pictureUrl')
+                competitions[i]['displayName'] = generate_mask(competitions[i].get('displayName'))
                 competitions[i]['time_spent'] = format_time_spent_str(competitions[i].get('time_spent'))
-                line_flex_str = replace_variable(line_flex_str, competitions[i], 1)
+                layers.append((competitions[i], 1))
             else:
                 data = {
                     'rank': '-',
@@ -451,33 +490,33 @@ class Quiz(Feature):
                     'correct_rate': '-',
                     'time_spent': '-'
                 }
-                line_flex_str = replace_variable(line_flex_str, data)
+                layers.append(data)
                 break
-        return line_flex_str
+        return compile_template(line_flex_str).render(*layers)
 
     def __generate_history_select(self, event, category):
         """Return
         使用者點擊歷史答題功能後，生成讓使用者選擇「我的錯題」和「全服錯題」選項的Flex Message
         """
-        line_flex_str = self.firebaseService.get_data(
+        line_flex_str = self.firebaseService.get_cached_data(
             DatabaseCollectionMap.LINE_FLEX,
             "quiz"
         ).get('history_select')
-        line_flex_str = replace_variable(line_flex_str, {"category" : category})
-        return LineBotHelper.reply_message(event, [FlexMessage(alt_text='選擇查看範圍', contents=FlexContainer.from_json(line_flex_str))])
+        line_flex_str = compile_template(line_flex_str).render({"category" : category})
+        return LineBotHelper.reply_message(event, [FlexJson(alt_text='選擇查看範圍', contents=line_flex_str)])
 
     def __generate_global_history_question(self, event, category):
         """Return
         生成「全服錯題」的Carousel，包含全服答錯率最高的十題
         """
         # 過濾掉回答數為0、且為同個類別主題的題目
-        quiz_questions = self.firebaseService.filter_data(DatabaseCollectionMap.QUIZ_QUESTION, [('category', '==', category), ('total_count', '>', 0)], ('correct_rate', 'asc'), 10)
+        quiz_questions = self.questionPool.lowest_correct_rate(category, 10)
 
         if not quiz_questions:
             return LineBotHelper.reply_message(event, [TextMessage(text='全服尚未有任何答題紀錄！')])
         else:
             # 生成carousel bubble
-            line_flex_str = self.firebaseService.get_data(
+            line_flex_str = self.firebaseService.get_cached_data(
                 DatabaseCollectionMap.LINE_FLEX,
                 "quiz"
             ).get('history_question_list')
@@ -492,16 +531,15 @@ class Quiz(Feature):
                 for i in range(5 - difficulty):
                     question[f'star_url_{difficulty + i + 1}'] = self.gray_star_url  # 替換灰色星星
 
-            line_flex_str = FlexMessageHelper.create_carousel_bubbles(quiz_questions, json.loads(line_flex_str))
-            line_flex_str = json.dumps(line_flex_str)
-            return LineBotHelper.reply_message(event, [FlexMessage(alt_text='全服錯題', contents=FlexContainer.from_json(line_flex_str))])
+            line_flex_strs = FlexMessageHelper.create_carousels(quiz_questions, line_flex_str)
+            return LineBotHelper.reply_message(event, [FlexJson(alt_text='全服錯題', contents=line_flex_str) for line_flex_str in line_flex_strs])
 
     def __generate_personal_history_question(self, event, category, user_id):
         """Return
         生成「我的錯題」的Carousel，包含個人答錯率最高的十題
         """
         quiz_records_df = pd.DataFrame(self.firebaseService.filter_data(DatabaseCollectionMap.QUIZ_RECORD, [('user_id', '==', user_id)]))
-        quiz_questions_df = pd.DataFrame(self.firebaseService.filter_data(DatabaseCollectionMap.QUIZ_QUESTION, [('category', '==', category)]))
+        quiz_questions_df = pd.DataFrame(self.questionPool.get_category(category))
         
         # 判斷該類別是否有任何答題記錄（依據total_count欄位）
         if quiz_questions_df['total_count'].sum() == 0:
@@ -546,33 +584,34 @@ class Quiz(Feature):
                         ten_questions_df.at[i, f'star_url_{index + 1}'] = star_url
 
                 # 抓模板
-                line_flex_str = self.firebaseService.get_data(
+                line_flex_str = self.firebaseService.get_cached_data(
                     DatabaseCollectionMap.LINE_FLEX,
                     "quiz"
                 ).get('history_question_list')
 
                 # 生成carousel bubble
-                line_flex_str = FlexMessageHelper.create_carousel_bubbles(ten_questions_df.to_dict('records'), json.loads(line_flex_str))
-                line_flex_str = json.dumps(line_flex_str)
-                return LineBotHelper.reply_message(event, [FlexMessage(alt_text='我的錯題', contents=FlexContainer.from_json(line_flex_str))])
+                line_flex_strs = FlexMessageHelper.create_carousels(ten_questions_df.to_dict('records'), line_flex_str)
+                return LineBotHelper.reply_message(event, [FlexJson(alt_text='我的錯題', contents=line_flex_str) for line_flex_str in line_flex_strs])
 
     def __generate_complete_history_question(self, event, question_id):
         """Return
         生成完整測驗題目的Flex Message（包含答案）
         """
         # 只提取id == question_id的題目資料
-        quiz_question = self.firebaseService.filter_data(DatabaseCollectionMap.QUIZ_QUESTION, [('id', '==', int(question_id))])[0]
+        quiz_question = self.questionPool.get(question_id)
 
         # 生成題目的Line Flex
-        line_flex_str = self.firebaseService.get_data(
+        line_flex_str = self.firebaseService.get_cached_data(
             DatabaseCollectionMap.LINE_FLEX,
             "quiz"
         ).get('history_question_with_image' if quiz_question.get('image_url') else 'history_question')
         quiz_question['width'] = 100 - quiz_question['correct_rate']
-        line_flex_str = replace_variable(line_flex_str, quiz_question)
 
-        # 生成星星
+        # 題目資料及星星一次替換
         difficulty = int(quiz_question['difficulty'])
-        line_flex_str = replace_variable(line_flex_str, {"star_url": self.gold_star_url}, difficulty)
-        line_flex_str = replace_variable(line_flex_str, {"star_url": self.gray_star_url}, 5 - difficulty)
-        return LineBotHelper.reply_message(event, [FlexMessage(alt_text='完整測驗題目', contents=FlexContainer.from_json(line_flex_str))])
\ No newline at end of file
+        line_flex_str = compile_template(line_flex_str).render(
+            quiz_question,
+            ({"star_url": self.gold_star_url}, difficulty),
+            ({"star_url": self.gray_star_url}, 5 - difficulty)
+        )
+        return LineBotHelper.reply_message(event, [FlexJson(alt_text='完整測驗題目', contents=line_flex_str)])
\ No newline at end of file
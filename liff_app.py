@@ -1,12 +1,10 @@
 from config import get_config
 from map import LIFF, EquipmentStatus, DatabaseCollectionMap, Permission, EquipmentType, EquipmentName
-from utils.utils import replace_variable
+from utils.utils import compile_template
 from flask import Blueprint, request, render_template, jsonify, abort
-from api.linebot_helper import LineBotHelper
+from api.linebot_helper import LineBotHelper, FlexJson
 from linebot.v3.messaging import (
-    TextMessage,
-    FlexMessage,
-    FlexContainer
+    TextMessage
 )
 from utils.error_handler import handle_exception
 
@@ -96,7 +94,7 @@ def rent(size):
             ('type', '==', equipment_id),
             ('status', '==', EquipmentStatus.AVAILABLE)
         ]
-        equipment['available_amount'] = len(firebaseService.filter_data(DatabaseCollectionMap.EQUIPMENT, conditions))
+        equipment['available_amount'] = int(firebaseService.get_aggregate_count(DatabaseCollectionMap.EQUIPMENT, conditions))
         equipment['equipment_id'] = equipment_id.value
         equipments.append(equipment)
 
@@ -110,14 +108,14 @@ def submit_rent():
     try:
         # 將處理過的 postback_data 存入 Firebase TEMP
         firebaseService.add_data(DatabaseCollectionMap.TEMP, user_id, data)
-        supervisors = [user.get('userId') for user in firebaseService.filter_data(DatabaseCollectionMap.USER, [('permission', '>=', Permission.LEADER)])]
-        line_flex_template = firebaseService.get_data(
+        supervisors = [user.get('userId') for user in firebaseService.filter_data(DatabaseCollectionMap.USER, [('permission', '>=', Permission.LEADER)], fields=['userId'])]
+        line_flex_template = firebaseService.get_cached_data(
             DatabaseCollectionMap.LINE_FLEX,
             "equipment"
         ).get("approve")
-        line_flex_str = replace_variable(line_flex_template, data)
+        line_flex_str = compile_template(line_flex_template).render(data)
         LineBotHelper.multicast_message(supervisors, [
-            FlexMessage(alt_text='租借申請確認', contents=FlexContainer.from_json(line_flex_str))
+            FlexJson(alt_text='租借申請確認', contents=line_flex_str)
         ])
 
         return jsonify({'message': "提交成功，等候審核處理"})
@@ -3,6 +3,9 @@ from features.base import feature_factory
 from map import Map, FeatureStatus, Permission, DatabaseCollectionMap
 from api.linebot_helper import LineBotHelper
 from utils.error_handler import handle_exception
+from utils.event_dispatcher import EventDispatcher
+from utils.idempotency import EventDeduplicator, MemoryIdempotencyStore, FirestoreIdempotencyStore
+from utils.metrics import firestore_metrics
 from flask import Blueprint, request, abort, current_app
 from linebot.v3.exceptions import InvalidSignatureError
 from linebot.v3.webhooks import (
@@ -13,6 +16,7 @@ from linebot.v3.webhooks import (
     TextMessageContent
 )
 from linebot.v3.messaging import ImageMessage, TextMessage
+import queue
 
 linebot_app = Blueprint('linebot_app', __name__)
 
@@ -21,7 +25,53 @@ configuration = config.configuration
 line_handler = config.handler
 firebaseService = config.firebaseService
 
-doc_watch = firebaseService.on_snapshot("quiz_questions")
+def event_user_id(event):
+    """Returns
+    str: 事件來源的使用者 ID（沒有時為 None）
+    """
+    return getattr(event.source, 'user_id', None) if event.source else None
+
+def dispatch_event(event):
+    """依事件類型呼叫對應的 handler（與 line_handler 註冊的對應相同）"""
+    if isinstance(event, MessageEvent):
+        if isinstance(event.message, TextMessageContent):
+            handle_message(event)
+    elif isinstance(event, PostbackEvent):
+        handle_postback(event)
+    elif isinstance(event, FollowEvent):
+        handle_follow(event)
+    elif isinstance(event, UnfollowEvent):
+        handle_unfollow(event)
+
+def process_event(event, app):
+    """於背景 worker 中處理單一事件，並記錄該事件的 Firestore 操作"""
+    with app.app_context():
+        token = firestore_metrics.start_request()
+        try:
+            dispatch_event(event)
+        finally:
+            summary = firestore_metrics.end_request(token)
+            if summary['operations']:
+                app.logger.info(
+                    f"Firestore {type(event).__name__}: "
+                    f"{summary['operations']} ops, {summary['documents']} docs, {summary['elapsed_ms']} ms"
+                )
+
+event_dispatcher = EventDispatcher(
+    process_event,
+    workers=config.WEBHOOK_WORKERS,
+    max_queue_size=config.WEBHOOK_QUEUE_SIZE,
+    enqueue_timeout=config.WEBHOOK_ENQUEUE_TIMEOUT,
+    name='webhook',
+    ordered_enqueue_timeout=config.WEBHOOK_ORDERED_ENQUEUE_TIMEOUT
+)
+
+if config.WEBHOOK_DEDUP_BACKEND == 'firestore':
+    event_deduplicator = EventDeduplicator(FirestoreIdempotencyStore(firebaseService, config.WEBHOOK_DEDUP_SIZE, config.WEBHOOK_DEDUP_TTL))
+elif config.WEBHOOK_DEDUP_BACKEND == 'memory':
+    event_deduplicator = EventDeduplicator(MemoryIdempotencyStore(config.WEBHOOK_DEDUP_SIZE, config.WEBHOOK_DEDUP_TTL))
+else:
+    event_deduplicator = EventDeduplicator(None)
 
 @linebot_app.route("/callback", methods=['POST'])
 def callback():
@@ -29,10 +79,30 @@ def callback():
     body = request.get_data(as_text=True)
     current_app.logger.info("Request body: " + body)
     try:
-        line_handler.handle(body, signature)
+        events = line_handler.parser.parse(body, signature)
     except InvalidSignatureError:
         current_app.logger.info("Invalid signature. Please check your channel access token/channel secret.")
         abort(400)
+    app = current_app._get_current_object()
+    for event in events:
+        if event_deduplicator.is_duplicate(event):
+            current_app.logger.info(f"Skip duplicate webhook event: {event.webhook_event_id}")
+            continue
+        # 同一位使用者的事件依序處理，避免同時讀寫 temp 等使用者資料
+        user_id = event_user_id(event)
+        if config.WEBHOOK_DISPATCH_MODE == 'async':
+            # 交給背景 worker 後立即回應 200；佇列已滿且該使用者沒有待處理的事件時於請求中處理
+            try:
+                event_dispatcher.dispatch(event, app, key=user_id)
+            except queue.Full:
+                # 該使用者較早的事件仍在佇列中，於請求中處理會打亂順序，回應 503 讓 LINE 稍後重送
+                current_app.logger.warning(f"Webhook queue is full, ask LINE to redeliver event: {event.webhook_event_id}")
+                event_deduplicator.forget(event)
+                abort(503)
+            continue
+        # 同步模式於請求中處理，只與同一位使用者的其他事件互斥
+        with event_dispatcher.lock_for(user_id):
+            dispatch_event(event)
     return 'OK'
 
 @line_handler.add(FollowEvent)
@@ -45,7 +115,7 @@ def handle_follow(event):
             user_yt = {'channel': '', 'level': 0, 'joinAt': ''}
             user_info.update({'permission': Permission.USER, 'isActive': True, 'youtube': user_yt})
             firebaseService.add_data(DatabaseCollectionMap.USER, user_id, user_info)
-        follow_doc = firebaseService.get_data(DatabaseCollectionMap.CONFIG, 'follow')
+        follow_doc = firebaseService.get_cached_data(DatabaseCollectionMap.CONFIG, 'follow')
         welcome_message = follow_doc.get('welcome_message').replace('\\n', '\n')
         image_url = follow_doc.get('welcome_image')
         messages = [
@@ -89,6 +89,7 @@ class DatabaseCollectionMap:
     Map資料庫Collection名稱
     """
     CONFIG = "config"
+    COUNTER = "counters"
     RICH_MENU = "rich_menu"
     LINE_FLEX = "line_flex"
     QUICK_REPLY = "quick_reply"
@@ -105,6 +106,9 @@ class DatabaseCollectionMap:
     QUIZ_QUESTION = "quiz_questions"
     QUIZ_RECORD = "quiz_records"
     QUIZ_LOG = "quiz_logs"
+    SCORE_HISTOGRAM = "score_histograms"
     COMPETITION = "competitions"
+    LEADERBOARD = "leaderboards"
     VIDEO = "videos"
-    NEWS = "news"
\ No newline at end of file
+    NEWS = "news"
+    WEBHOOK_EVENT = "webhook_events"
\ No newline at end of file
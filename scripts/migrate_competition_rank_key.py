@@ -0,0 +1,63 @@
+"""
+為既有的競賽紀錄補上 time_ms 及 rank_key，並清除排行榜讓其依新欄位重建
+
+使用方式（於專案根目錄，需設定與主程式相同的環境變數）：
+    python -m scripts.migrate_competition_rank_key [--dry-run]
+
+查詢排行榜需建立 competitions 的複合索引：competition_id (==) + rank_key (asc)
+"""
+from config import get_config
+from map import DatabaseCollectionMap
+from utils.leaderboard import Leaderboard
+import sys
+
+config = get_config()
+
+def compute_time_ms(competition: dict) -> int:
+    """Returns
+    int: 競賽花費的毫秒數，優先以開始與結束時間計算，否則由 time_spent 字串換算
+    """
+    start_time = competition.get('start_time')
+    end_time = competition.get('end_time')
+    if start_time and end_time:
+        return int((end_time - start_time).total_seconds() * 1000)
+    return Leaderboard.time_spent_to_ms(competition['time_spent'])
+
+def migrate(dry_run: bool = False) -> int:
+    """補上 rank_key 並刪除排行榜文件
+
+    Args:
+        dry_run (bool): 只計算需更新的筆數，不寫入
+
+    Returns:
+        int: 更新的競賽紀錄數量
+    """
+    firebaseService = config.firebaseService
+    updated = 0
+    competition_ids = set()
+    with firebaseService.batch() as batch:
+        for competition in firebaseService.iter_collection(
+            DatabaseCollectionMap.COMPETITION,
+            fields=['competition_id', 'start_time', 'end_time', 'time_spent', 'correct_amount', 'rank_key']
+        ):
+            # 尚未完成的競賽沒有 time_spent，完成時才會寫入 rank_key
+            if not competition.get('time_spent') or competition.get('rank_key') is not None:
+                continue
+            time_ms = compute_time_ms(competition)
+            competition_ids.add(competition.get('competition_id'))
+            updated += 1
+            if not dry_run:
+                batch.update_data(DatabaseCollectionMap.COMPETITION, competition['doc_id'], {
+                    'time_ms': time_ms,
+                    'rank_key': Leaderboard.make_rank_key(competition.get('correct_amount'), time_ms)
+                })
+        if not dry_run:
+            # 排行榜下次查詢時由 competitions 重建，成績即包含 time_ms 與 rank_key
+            for competition_id in competition_ids:
+                batch.delete_data(DatabaseCollectionMap.LEADERBOARD, competition_id)
+    return updated
+
+if __name__ == '__main__':
+    dry_run = '--dry-run' in sys.argv
+    count = migrate(dry_run)
+    print(f"{'Found' if dry_run else 'Updated'} {count} competition records")
@@ -0,0 +1,58 @@
+"""
+由 quiz_logs 重建各類別的答對題數分布（score_histograms）
+
+舊的 quiz_logs 沒有 category 欄位，會由該次測驗第一筆作答紀錄的題目類別補上並寫回。
+
+使用方式（於專案根目錄，需設定與主程式相同的環境變數）：
+    python -m scripts.rebuild_score_histogram [--dry-run]
+"""
+from config import get_config
+from map import DatabaseCollectionMap
+import sys
+
+config = get_config()
+
+def rebuild(dry_run: bool = False) -> dict:
+    """重建分布，結果全部寫入各類別的第 0 個分片，其餘分片刪除
+
+    Args:
+        dry_run (bool): 只計算分布，不寫入
+
+    Returns:
+        dict: 類別 -> {答對題數: 人數}
+    """
+    firebaseService = config.firebaseService
+    question_categories = {
+        question.get('id'): question.get('category')
+        for question in firebaseService.get_collection_data(DatabaseCollectionMap.QUIZ_QUESTION, fields=['id', 'category'])
+    }
+    histograms = {}
+    with firebaseService.batch() as batch:
+        for quiz_log in firebaseService.iter_collection(DatabaseCollectionMap.QUIZ_LOG, fields=['quiz_id', 'category', 'correct_amount']):
+            category = quiz_log.get('category')
+            if not category:
+                quiz_records = firebaseService.filter_data(DatabaseCollectionMap.QUIZ_RECORD, [('quiz_id', '==', quiz_log.get('quiz_id'))], limit=1, fields=['question_id'])
+                if not quiz_records:
+                    continue
+                category = question_categories.get(int(quiz_records[0].get('question_id')))
+                if not category:
+                    continue
+                if not dry_run:
+                    batch.update_data(DatabaseCollectionMap.QUIZ_LOG, quiz_log['doc_id'], {'category': category})
+            buckets = histograms.setdefault(category, {})
+            correct_amount = int(quiz_log.get('correct_amount'))
+            buckets[correct_amount] = buckets.get(correct_amount, 0) + 1
+
+        if not dry_run:
+            for shard in firebaseService.get_collection_data(DatabaseCollectionMap.SCORE_HISTOGRAM, fields=['category']):
+                batch.delete_data(DatabaseCollectionMap.SCORE_HISTOGRAM, shard['doc_id'])
+            for category, buckets in histograms.items():
+                batch.add_data(DatabaseCollectionMap.SCORE_HISTOGRAM, f'{category}_0', {
+                    'category': category,
+                    'buckets': {str(score): count for score, count in buckets.items()}
+                })
+    return histograms
+
+if __name__ == '__main__':
+    for category, buckets in rebuild('--dry-run' in sys.argv).items():
+        print(category, dict(sorted(buckets.items())))
@@ -0,0 +1,39 @@
+"""
+刪除 quiz_questions 中保存的 correct_rate 欄位
+
+correct_rate 已改為讀取題目時由 correct_count / total_count 計算（見 utils.quiz_pool），
+文件中的舊值不再更新，刪除以免直接讀取文件（例如後台資料瀏覽）時看到過時的正確率。
+
+使用方式（於專案根目錄，需設定與主程式相同的環境變數）：
+    python -m scripts.remove_question_correct_rate [--dry-run]
+"""
+from config import get_config
+from map import DatabaseCollectionMap
+import sys
+
+config = get_config()
+
+def remove_correct_rate(dry_run: bool = False) -> int:
+    """刪除題目文件中的 correct_rate
+
+    Args:
+        dry_run (bool): 只計算需更新的筆數，不寫入
+
+    Returns:
+        int: 更新的題目數量
+    """
+    firebaseService = config.firebaseService
+    updated = 0
+    with firebaseService.batch() as batch:
+        for question in firebaseService.iter_collection(DatabaseCollectionMap.QUIZ_QUESTION, fields=['correct_rate']):
+            if 'correct_rate' not in question:
+                continue
+            updated += 1
+            if not dry_run:
+                batch.update_data(DatabaseCollectionMap.QUIZ_QUESTION, question['doc_id'], {'correct_rate': firebaseService.delete_field()})
+    return updated
+
+if __name__ == '__main__':
+    dry_run = '--dry-run' in sys.argv
+    count = remove_correct_rate(dry_run)
+    print(f"{'Found' if dry_run else 'Updated'} {count} quiz questions")
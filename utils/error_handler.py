@@ -34,7 +34,7 @@ def handle_exception(e, admin_notification=False, event=None, return_json=False)
             LineBotHelper.show_loading_animation_(event)
             LineBotHelper.push_message(
                 firebaseService.filter_data(
-                    'users', [('permission', '==', Permission.ADMIN)]
+                    'users', [('permission', '==', Permission.ADMIN)], limit=1, fields=['userId']
                 )[0]['userId'],
                 [TextMessage(text=error_message)]
             )
@@ -0,0 +1,248 @@
+from contextlib import contextmanager
+import threading
+import queue
+import time
+import atexit
+import itertools
+import zlib
+
+class EventDispatcher:
+    """
+    以固定數量的背景 worker 處理事件
+
+    - 每個 worker 各有一個佇列（分片），submit 依 key 決定分片，
+      相同 key（例如同一位使用者）的事件依序在同一個 worker 執行，不同 key 則平行處理
+    - submit 將事件放入有上限的佇列，佇列已滿且等待逾時時回傳 False，由呼叫端自行處理
+    - dispatch 在佇列已滿時，只有該 key 沒有待處理的事件才於呼叫端的執行緒直接處理（藉此將壓力回推給呼叫端）；
+      否則繼續等待佇列空位（最多 ordered_enqueue_timeout 秒），仍無空位時拋出 queue.Full，
+      避免同一個 key 較晚的事件比佇列中較早的事件先處理
+    - 處理事件時持有 key 專屬的鎖（lock_for），同一個 key 不會同時處理，不同 key 互不等待
+    - stats 提供佇列深度及處理數量等統計
+    - shutdown 停止接收新事件並等待佇列中的事件處理完畢（程序結束時自動呼叫）
+    """
+    def __init__(self, handler, workers: int = 4, max_queue_size: int = 100, enqueue_timeout: float = 1.0, name: str = 'event-dispatcher', ordered_enqueue_timeout: float = 5.0):
+        """
+        Args:
+            handler (callable): 處理事件的函式，以 submit 的參數呼叫
+            workers (int): worker（分片）數量
+            max_queue_size (int): 每個分片的佇列上限
+            enqueue_timeout (float): 佇列已滿時等待的秒數
+            name (str): worker 執行緒名稱前綴
+            ordered_enqueue_timeout (float): dispatch 時 key 仍有待處理事件、佇列已滿時最多再等待的秒數
+        """
+        self._handler = handler
+        self._workers_count = workers
+        self._enqueue_timeout = enqueue_timeout
+        self._ordered_enqueue_timeout = ordered_enqueue_timeout
+        self._name = name
+        self._queues = [queue.Queue(maxsize=max_queue_size) for _ in range(workers)]
+        # 各 key 的執行鎖 {key: [Lock, 持有或等待的數量]}，數量歸零時移除
+        self._key_locks = {}
+        self._key_locks_lock = threading.Lock()
+        self._round_robin = itertools.count()
+        self._workers = []
+        self._lock = threading.Lock()
+        # 各 key 在佇列中（尚未處理完）的事件數量，及正在呼叫端直接處理的 key
+        self._pending = {}
+        self._inline_keys = set()
+        self._inline_done = threading.Condition(self._lock)
+        self._accepting = True
+        self._stats = {
+            'submitted': 0,
+            'processed': 0,
+            'failed': 0,
+            'rejected': 0,
+            'inline': 0,
+            'max_queue_depth': 0,
+            'total_wait_ms': 0.0,
+            'total_process_ms': 0.0
+        }
+
+    def _start(self):
+        """第一次 submit 時才啟動 worker，避免在 fork 前建立執行緒"""
+        with self._lock:
+            if self._workers:
+                return
+            for index in range(self._workers_count):
+                worker = threading.Thread(target=self._run, args=(index,), name=f'{self._name}-{index}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            atexit.register(self.shutdown)
+
+    def _shard(self, key) -> int:
+        """Returns
+        int: key 對應的分片，未指定 key 時輪流分配
+        """
+        if key is None:
+            return next(self._round_robin) % self._workers_count
+        # 使用 crc32 而非 hash()，讓不同程序的分片結果一致
+        return zlib.crc32(str(key).encode('utf-8')) % self._workers_count
+
+    @contextmanager
+    def lock_for(self, key):
+        """持有 key 專屬的執行鎖，同步處理事件時使用，避免與 worker 或其他請求同時處理同一個 key；
+        不同 key 的鎖互相獨立，key 為 None 時不鎖定
+
+        Example:
+            with dispatcher.lock_for(user_id):
+                handle(event)
+        """
+        if key is None:
+            yield
+            return
+        with self._key_locks_lock:
+            entry = self._key_locks.get(key)
+            if entry is None:
+                entry = self._key_locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._key_locks_lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
+
+    def submit(self, *args, key=None) -> bool:
+        """將事件放入 key 所屬分片的佇列
+
+        Args:
+            key (optional): 分片依據，相同 key 的事件依放入順序執行
+
+        Returns:
+            bool: 是否成功放入佇列，False 時由呼叫端自行處理（需確認該 key 沒有待處理的事件，見 dispatch）
+        """
+        return self._put(args, key, self._enqueue_timeout)
+
+    def dispatch(self, *args, key=None) -> bool:
+        """將事件放入佇列；佇列已滿且該 key 沒有待處理的事件時，直接在目前的執行緒處理
+
+        Args:
+            key (optional): 分片依據，相同 key 的事件依序執行
+
+        Returns:
+            bool: True 為已放入佇列，False 為已直接處理
+
+        Raises:
+            queue.Full: 該 key 仍有待處理的事件且佇列持續已滿（呼叫端可回應 503 讓事件稍後重送）
+        """
+        if self._put(args, key, self._enqueue_timeout):
+            return True
+        with self._lock:
+            # 檢查與登記在同一個鎖內，之後放入佇列的同 key 事件會等這次處理完才執行
+            has_pending = key is not None and (self._pending.get(key) or key in self._inline_keys)
+            if not has_pending and key is not None:
+                self._inline_keys.add(key)
+        if has_pending:
+            if self._put(args, key, self._ordered_enqueue_timeout):
+                return True
+            raise queue.Full(f'{self._name}: queue is full and key {key} has pending events')
+        try:
+            with self.lock_for(key):
+                self._handler(*args)
+        finally:
+            with self._lock:
+                self._inline_keys.discard(key)
+                self._stats['inline'] += 1
+                self._inline_done.notify_all()
+        return False
+
+    def _put(self, args: tuple, key, timeout: float) -> bool:
+        """Returns
+        bool: 是否在 timeout 秒內放入 key 所屬分片的佇列
+        """
+        if not self._accepting:
+            return False
+        if not self._workers:
+            self._start()
+        shard_queue = self._queues[self._shard(key)]
+        with self._lock:
+            # 放入前先計數，讓 dispatch 判斷 key 是否有待處理的事件
+            self._pending[key] = self._pending.get(key, 0) + 1
+        try:
+            shard_queue.put((time.perf_counter(), key, args), timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self._release(key)
+                self._stats['rejected'] += 1
+            return False
+        with self._lock:
+            self._stats['submitted'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], shard_queue.qsize())
+        return True
+
+    def _release(self, key):
+        """key 的待處理事件數量減一（呼叫端需持有 _lock）"""
+        if self._pending.get(key, 0) <= 1:
+            self._pending.pop(key, None)
+        else:
+            self._pending[key] -= 1
+
+    def _run(self, index: int):
+        shard_queue = self._queues[index]
+        while True:
+            item = shard_queue.get()
+            try:
+                if item is None:
+                    return
+                enqueued_at, key, args = item
+                with self._inline_done:
+                    # 同 key 的事件正在呼叫端直接處理時，等它處理完（它比佇列中的事件早到）
+                    while key is not None and key in self._inline_keys:
+                        self._inline_done.wait()
+                with self.lock_for(key):
+                    started_at = time.perf_counter()
+                    try:
+                        self._handler(*args)
+                        succeeded = True
+                    except Exception as e:
+                        # handler 應自行處理例外，這裡只避免 worker 中止
+                        print(f'{self._name} failed to handle event: {e}')
+                        succeeded = False
+                    finished_at = time.perf_counter()
+                with self._lock:
+                    self._release(key)
+                    self._stats['processed' if succeeded else 'failed'] += 1
+                    self._stats['total_wait_ms'] += (started_at - enqueued_at) * 1000
+                    self._stats['total_process_ms'] += (finished_at - started_at) * 1000
+            finally:
+                shard_queue.task_done()
+
+    def stats(self) -> dict:
+        """Returns
+        dict: 佇列深度、處理數量及平均等待/處理時間
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        handled = stats['processed'] + stats['failed']
+        stats.update({
+            'workers': len(self._workers),
+            'queue_depth': sum(shard_queue.qsize() for shard_queue in self._queues),
+            'shard_depths': [shard_queue.qsize() for shard_queue in self._queues],
+            'queue_size': sum(shard_queue.maxsize for shard_queue in self._queues),
+            'avg_wait_ms': round(stats.pop('total_wait_ms') / handled, 2) if handled else 0,
+            'avg_process_ms': round(stats.pop('total_process_ms') / handled, 2) if handled else 0
+        })
+        return stats
+
+    def shutdown(self, timeout: float = 30):
+        """停止接收新事件，等待佇列中的事件處理完畢後結束 worker
+
+        Args:
+            timeout (float): 最多等待的秒數
+        """
+        self._accepting = False
+        with self._lock:
+            workers, self._workers = self._workers, []
+        if not workers:
+            return
+        deadline = time.monotonic() + timeout
+        # 每個 worker 收到 None 後結束，None 排在該分片既有事件之後
+        for shard_queue in self._queues:
+            try:
+                shard_queue.put(None, timeout=max(deadline - time.monotonic(), 0))
+            except queue.Full:
+                continue
+        for worker in workers:
+            worker.join(max(deadline - time.monotonic(), 0))
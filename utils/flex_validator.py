@@ -0,0 +1,208 @@
+from typing import Any, Dict, List
+import json
+import threading
+import weakref
+
+class FlexValidationError(ValueError):
+    """Flex Message 格式錯誤"""
+
+class FlexValidator:
+    """
+    本地端 LINE 訊息格式檢查
+
+    依 LINE Messaging API 的限制檢查訊息結構（bubble/carousel 結構、必要欄位、數量與大小上限），
+    用來取代每次回覆前呼叫 validate_reply API。
+    contents 由模板產生時（utils.utils.RenderedTemplate），同一模板的結構只完整檢查一次，
+    之後只檢查 JSON 語法、大小及 altText；其他訊息每次完整檢查。
+    """
+    # 已通過結構檢查的模板（模板被回收時自動移除）
+    _checked_templates = weakref.WeakSet()
+    _lock = threading.Lock()
+    # 單次回覆/推播的訊息數量上限
+    MAX_MESSAGES = 5
+    # carousel 的 bubble 數量上限
+    MAX_BUBBLES = 12
+    # JSON 大小上限（bytes）
+    MAX_BUBBLE_BYTES = 30 * 1024
+    MAX_CAROUSEL_BYTES = 50 * 1024
+    MAX_ALT_TEXT_LENGTH = 1500
+    MAX_TEXT_LENGTH = 5000
+
+    BUBBLE_SIZES = {'nano', 'micro', 'deca', 'hecto', 'kilo', 'mega', 'giga'}
+    BOX_LAYOUTS = {'horizontal', 'vertical', 'baseline'}
+    # 各元件的必要欄位
+    COMPONENT_REQUIRED_FIELDS = {
+        'box': ('layout', 'contents'),
+        'button': ('action',),
+        'image': ('url',),
+        'video': ('url', 'previewUrl', 'altContent'),
+        'icon': ('url',),
+        'text': (),
+        'span': ('text',),
+        'separator': (),
+        'filler': ()
+    }
+    # 各動作的必要欄位
+    ACTION_REQUIRED_FIELDS = {
+        'postback': ('data',),
+        'message': ('text',),
+        'uri': ('uri',),
+        'datetimepicker': ('data', 'mode'),
+        'camera': (),
+        'cameraRoll': (),
+        'location': (),
+        'richmenuswitch': ('richMenuAliasId', 'data'),
+        'clipboard': ('clipboardText',)
+    }
+
+    @staticmethod
+    def validate_messages(messages: list):
+        """檢查要送出的訊息列表，格式錯誤時拋出 FlexValidationError
+
+        Args:
+            messages (list): SDK 訊息物件（需有 to_json）或已轉為 JSON 字串的訊息
+        """
+        if not 0 < len(messages) <= FlexValidator.MAX_MESSAGES:
+            raise FlexValidationError(f'messages: 訊息數量需為 1~{FlexValidator.MAX_MESSAGES} 則，目前為 {len(messages)} 則')
+        for index, message in enumerate(messages):
+            if isinstance(message, str):
+                FlexValidator.validate_message_json(message, f'messages[{index}]')
+                continue
+            # FlexJson 的 contents 已是 JSON 字串，直接以其長度計算大小
+            contents = getattr(message, 'contents', None)
+            FlexValidator.validate_message_json(
+                message.to_json(),
+                f'messages[{index}]',
+                size=len(contents.encode('utf-8')) if isinstance(contents, str) else None,
+                template=getattr(contents, 'template', None)
+            )
+
+    @staticmethod
+    def validate_message_json(message_json: str, path: str = 'message', size: int = None, template=None):
+        """檢查單則訊息的 JSON 字串
+
+        Args:
+            message_json (str): 訊息 JSON
+            path (str): 錯誤訊息中的欄位路徑
+            size (int, optional): Flex contents 的大小（bytes），未提供時以整則訊息的大小計算（較嚴格）
+            template (optional): 產生 contents 的模板，已檢查過的模板只檢查語法及大小
+        """
+        message = json.loads(message_json)
+        if size is None:
+            size = len(message_json.encode('utf-8'))
+        if template is not None:
+            with FlexValidator._lock:
+                checked = template in FlexValidator._checked_templates
+            if checked and message.get('type') == 'flex':
+                FlexValidator._validate_flex_message(message, path, size, check_structure=False)
+                return
+        FlexValidator._validate_message(message, path, size)
+        if template is not None:
+            with FlexValidator._lock:
+                FlexValidator._checked_templates.add(template)
+
+    @staticmethod
+    def _require(data: Dict[str, Any], fields, path: str):
+        for field in fields:
+            if data.get(field) in (None, ''):
+                raise FlexValidationError(f'{path}.{field}: 缺少必要欄位')
+
+    @staticmethod
+    def _validate_flex_message(message: Dict[str, Any], path: str, size: int, check_structure: bool = True):
+        FlexValidator._require(message, ('altText', 'contents'), path)
+        if len(message['altText']) > FlexValidator.MAX_ALT_TEXT_LENGTH:
+            raise FlexValidationError(f'{path}.altText: 長度超過 {FlexValidator.MAX_ALT_TEXT_LENGTH} 字')
+        FlexValidator._validate_container(message['contents'], f'{path}.contents', size, check_structure)
+
+    @staticmethod
+    def _validate_message(message: Dict[str, Any], path: str, size: int):
+        message_type = message.get('type')
+        if message_type == 'flex':
+            FlexValidator._validate_flex_message(message, path, size)
+        elif message_type == 'text':
+            FlexValidator._require(message, ('text',), path)
+            if len(message['text']) > FlexValidator.MAX_TEXT_LENGTH:
+                raise FlexValidationError(f'{path}.text: 長度超過 {FlexValidator.MAX_TEXT_LENGTH} 字')
+        elif message_type == 'image':
+            FlexValidator._require(message, ('originalContentUrl', 'previewImageUrl'), path)
+        elif not message_type:
+            raise FlexValidationError(f'{path}.type: 缺少必要欄位')
+        if message.get('quickReply'):
+            for index, item in enumerate(message['quickReply'].get('items', [])):
+                FlexValidator._validate_action(item.get('action') or {}, f'{path}.quickReply.items[{index}].action')
+
+    @staticmethod
+    def _validate_container(container: Dict[str, Any], path: str, size: int, check_structure: bool = True):
+        container_type = container.get('type')
+        if container_type == 'bubble':
+            if size > FlexValidator.MAX_BUBBLE_BYTES:
+                raise FlexValidationError(f'{path}: bubble 大小 {size} bytes 超過 {FlexValidator.MAX_BUBBLE_BYTES} bytes')
+            if check_structure:
+                FlexValidator._validate_bubble(container, path)
+        elif container_type == 'carousel':
+            if size > FlexValidator.MAX_CAROUSEL_BYTES:
+                raise FlexValidationError(f'{path}: carousel 大小 {size} bytes 超過 {FlexValidator.MAX_CAROUSEL_BYTES} bytes')
+            bubbles = container.get('contents')
+            if not isinstance(bubbles, list) or not 0 < len(bubbles) <= FlexValidator.MAX_BUBBLES:
+                count = len(bubbles) if isinstance(bubbles, list) else 0
+                raise FlexValidationError(f'{path}.contents: carousel 需有 1~{FlexValidator.MAX_BUBBLES} 個 bubble，目前為 {count} 個')
+            if not check_structure:
+                return
+            for index, bubble in enumerate(bubbles):
+                if bubble.get('type') != 'bubble':
+                    raise FlexValidationError(f'{path}.contents[{index}].type: carousel 只能包含 bubble')
+                FlexValidator._validate_bubble(bubble, f'{path}.contents[{index}]')
+        else:
+            raise FlexValidationError(f'{path}.type: 必須為 bubble 或 carousel')
+
+    @staticmethod
+    def _validate_bubble(bubble: Dict[str, Any], path: str):
+        if bubble.get('size') and bubble['size'] not in FlexValidator.BUBBLE_SIZES:
+            raise FlexValidationError(f'{path}.size: 不支援的大小 {bubble["size"]}')
+        if bubble.get('direction') and bubble['direction'] not in ('ltr', 'rtl'):
+            raise FlexValidationError(f'{path}.direction: 必須為 ltr 或 rtl')
+        if not any(bubble.get(block) for block in ('header', 'hero', 'body', 'footer')):
+            raise FlexValidationError(f'{path}: bubble 至少需要一個區塊')
+        for block in ('header', 'body', 'footer'):
+            if bubble.get(block):
+                if bubble[block].get('type') != 'box':
+                    raise FlexValidationError(f'{path}.{block}.type: 必須為 box')
+                FlexValidator._validate_component(bubble[block], f'{path}.{block}')
+        if bubble.get('hero'):
+            if bubble['hero'].get('type') not in ('box', 'image', 'video'):
+                raise FlexValidationError(f'{path}.hero.type: 必須為 box、image 或 video')
+            FlexValidator._validate_component(bubble['hero'], f'{path}.hero')
+        if bubble.get('action'):
+            FlexValidator._validate_action(bubble['action'], f'{path}.action')
+
+    @staticmethod
+    def _validate_component(component: Dict[str, Any], path: str):
+        component_type = component.get('type')
+        if component_type not in FlexValidator.COMPONENT_REQUIRED_FIELDS:
+            raise FlexValidationError(f'{path}.type: 不支援的元件類型 {component_type}')
+        FlexValidator._require(component, FlexValidator.COMPONENT_REQUIRED_FIELDS[component_type], path)
+
+        if component_type == 'box':
+            if component['layout'] not in FlexValidator.BOX_LAYOUTS:
+                raise FlexValidationError(f'{path}.layout: 不支援的排列方式 {component["layout"]}')
+            contents: List[Dict[str, Any]] = component['contents']
+            for index, child in enumerate(contents):
+                FlexValidator._validate_component(child, f'{path}.contents[{index}]')
+        elif component_type == 'text':
+            if not component.get('text') and not component.get('contents'):
+                raise FlexValidationError(f'{path}.text: 缺少必要欄位')
+            for index, span in enumerate(component.get('contents') or []):
+                FlexValidator._validate_component(span, f'{path}.contents[{index}]')
+        elif component_type in ('image', 'icon'):
+            if not component['url'].startswith('https://'):
+                raise FlexValidationError(f'{path}.url: 必須為 https 網址')
+
+        if component.get('action'):
+            FlexValidator._validate_action(component['action'], f'{path}.action')
+
+    @staticmethod
+    def _validate_action(action: Dict[str, Any], path: str):
+        action_type = action.get('type')
+        if action_type not in FlexValidator.ACTION_REQUIRED_FIELDS:
+            raise FlexValidationError(f'{path}.type: 不支援的動作類型 {action_type}')
+        FlexValidator._require(action, FlexValidator.ACTION_REQUIRED_FIELDS[action_type], path)
@@ -0,0 +1,128 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from map import DatabaseCollectionMap
+import threading
+import time
+import pytz
+
+class MemoryIdempotencyStore:
+    """
+    程序內的去重紀錄（LRU + TTL）
+
+    超過 max_size 時淘汰最舊的紀錄，超過 ttl 秒的紀錄視為不存在
+    """
+    def __init__(self, max_size: int = 10000, ttl: int = 3600):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def mark(self, key: str) -> bool:
+        """記錄 key
+
+        Returns:
+            bool: 是否為第一次出現（已記錄且尚未過期時為 False）
+        """
+        now = time.monotonic()
+        with self._lock:
+            expire_at = self._entries.get(key)
+            if expire_at is not None and expire_at > now:
+                self._entries.move_to_end(key)
+                return False
+            self._entries[key] = now + self._ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+            return True
+
+    def forget(self, key: str):
+        """移除 key 的紀錄，之後再出現時視為第一次出現"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+class FirestoreIdempotencyStore:
+    """
+    以 Firestore 記錄去重紀錄，供多個程序／實例共用
+
+    先查程序內紀錄，未命中時以 create 寫入 webhook_events/{key}，文件已存在即為重複。
+    文件的 expireAt 可搭配 Firestore TTL 政策自動刪除過期紀錄。
+    """
+    def __init__(self, firebaseService, max_size: int = 10000, ttl: int = 3600):
+        self._firebaseService = firebaseService
+        self._ttl = ttl
+        self._local = MemoryIdempotencyStore(max_size, ttl)
+
+    def mark(self, key: str) -> bool:
+        """記錄 key
+
+        Returns:
+            bool: 是否為第一次出現
+        """
+        if not self._local.mark(key):
+            return False
+        now = datetime.now(pytz.timezone('Asia/Taipei'))
+        return self._firebaseService.create_data(DatabaseCollectionMap.WEBHOOK_EVENT, key, {
+            'createdAt': now,
+            'expireAt': now + timedelta(seconds=self._ttl)
+        })
+
+    def forget(self, key: str):
+        """移除 key 的紀錄（本地及 Firestore）"""
+        self._local.forget(key)
+        self._firebaseService.delete_data(DatabaseCollectionMap.WEBHOOK_EVENT, key)
+
+class EventDeduplicator:
+    """
+    依 webhookEventId 過濾 LINE 重送的事件
+
+    LINE 在逾時等情況下會重送事件（deliveryContext.isRedelivery 為 True），
+    webhookEventId 與原事件相同，已處理過的事件在執行任何功能前略過
+    """
+    def __init__(self, store):
+        """
+        Args:
+            store: MemoryIdempotencyStore 或 FirestoreIdempotencyStore，None 時不去重
+        """
+        self._store = store
+        self._stats = {'checked': 0, 'redelivered': 0, 'duplicates': 0, 'errors': 0}
+        self._lock = threading.Lock()
+
+    def is_duplicate(self, event) -> bool:
+        """Returns
+        bool: 事件是否已處理過（無法判斷時視為未處理過）
+        """
+        event_id = getattr(event, 'webhook_event_id', None)
+        if self._store is None or not event_id:
+            return False
+        delivery_context = getattr(event, 'delivery_context', None)
+        redelivered = bool(delivery_context and delivery_context.is_redelivery)
+        try:
+            duplicate = not self._store.mark(event_id)
+            error = False
+        except Exception as e:
+            # 去重紀錄無法使用時仍處理事件，避免漏掉訊息
+            print(f'Failed to check webhook event {event_id}: {e}')
+            duplicate, error = False, True
+        with self._lock:
+            self._stats['checked'] += 1
+            self._stats['redelivered'] += redelivered
+            self._stats['duplicates'] += duplicate
+            self._stats['errors'] += error
+        return duplicate
+
+    def forget(self, event):
+        """移除事件的去重紀錄，讓 LINE 重送的同一事件可以再被處理（例如事件因佇列已滿而未處理）"""
+        event_id = getattr(event, 'webhook_event_id', None)
+        if self._store is None or not event_id:
+            return
+        try:
+            self._store.forget(event_id)
+        except Exception as e:
+            print(f'Failed to forget webhook event {event_id}: {e}')
+
+    def stats(self) -> dict:
+        """Returns
+        dict: 檢查、重送及略過的事件數量
+        """
+        with self._lock:
+            return dict(self._stats)
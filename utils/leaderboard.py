@@ -0,0 +1,276 @@
+from map import DatabaseCollectionMap
+import bisect
+import threading
+
+class Leaderboard:
+    """
+    單一競賽的排行榜
+
+    依排名鍵由小到大保存，排名鍵相同者名次相同（與 rank(method='min') 相同），
+    查詢名次以二分搜尋，為 O(log n)
+    """
+    # 排名鍵中時間（毫秒）所佔的位數範圍
+    TIME_MS_LIMIT = 10 ** 10
+    # 答對題數上限（排名鍵以此減去答對題數，讓答對越多者排名鍵越小）
+    MAX_CORRECT_AMOUNT = 1000
+
+    def __init__(self, entries: dict = None):
+        """
+        Args:
+            entries (dict): 使用者ID -> 成績
+        """
+        self._entries = {}
+        for entry in (entries or {}).values():
+            self._entries[entry['user_id']] = entry
+        self._keys = sorted(self.key(entry) for entry in self._entries.values())
+
+    @staticmethod
+    def make_rank_key(correct_amount: int, time_ms: int) -> int:
+        """將答對題數與花費時間合成單一數值，可直接以 Firestore order_by 排序
+
+        Returns:
+            int: 排名鍵，越小名次越前（答對題數多者優先，相同時花費時間少者優先）
+        """
+        return (Leaderboard.MAX_CORRECT_AMOUNT - int(correct_amount)) * Leaderboard.TIME_MS_LIMIT + min(int(time_ms), Leaderboard.TIME_MS_LIMIT - 1)
+
+    @staticmethod
+    def time_spent_to_ms(time_spent: str) -> int:
+        """Returns
+        int: 時間字串 (小時:分鐘:秒) 對應的毫秒數
+        """
+        hours, minutes, seconds = (int(value) for value in time_spent.split(':'))
+        return ((hours * 60 + minutes) * 60 + seconds) * 1000
+
+    @staticmethod
+    def rank_key(entry: dict) -> int:
+        """Returns
+        int: 成績的排名鍵（舊資料沒有 rank_key 時由 time_spent 計算）
+        """
+        if entry.get('rank_key') is not None:
+            return entry['rank_key']
+        time_ms = entry.get('time_ms')
+        if time_ms is None:
+            time_ms = Leaderboard.time_spent_to_ms(entry['time_spent'])
+        return Leaderboard.make_rank_key(entry['correct_amount'], time_ms)
+
+    @staticmethod
+    def key(entry: dict) -> tuple:
+        """Returns
+        tuple: 排序用的鍵（排名鍵加上使用者ID，讓每筆成績唯一）
+        """
+        return (Leaderboard.rank_key(entry), entry['user_id'])
+
+    def add(self, entry: dict):
+        """新增或更新使用者成績"""
+        self.remove(entry['user_id'])
+        self._entries[entry['user_id']] = entry
+        bisect.insort(self._keys, self.key(entry))
+
+    def remove(self, user_id: str):
+        """移除使用者成績"""
+        previous = self._entries.pop(user_id, None)
+        if previous is not None:
+            index = bisect.bisect_left(self._keys, self.key(previous))
+            if index < len(self._keys) and self._keys[index] == self.key(previous):
+                self._keys.pop(index)
+
+    def rank(self, user_id: str) -> int:
+        """Returns
+        int: 使用者名次（從 1 開始），未參賽時為 None
+        """
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        return bisect.bisect_left(self._keys, (self.rank_key(entry),)) + 1
+
+    def get(self, user_id: str) -> dict:
+        """Returns
+        dict: 使用者成績（含名次）的複本，未參賽時為 None
+        """
+        entry = self._entries.get(user_id)
+        return dict(entry, rank=self.rank(user_id)) if entry is not None else None
+
+    def top(self, n: int) -> list:
+        """Returns
+        list: 前 n 名成績（含名次）的複本
+        """
+        return [
+            dict(self._entries[key[1]], rank=bisect.bisect_left(self._keys, (key[0],)) + 1)
+            for key in self._keys[:n]
+        ]
+
+    def __len__(self):
+        return len(self._keys)
+
+class CompetitionLeaderboards:
+    """
+    各競賽的排行榜
+
+    每位使用者的成績保存為一份文件 leaderboards/{competition_id}/entries/{user_id}，
+    以 on_snapshot 逐筆同步至記憶體的排行榜（每筆變更 O(log n) 搜尋位置）；完成競賽時只寫入該使用者的文件，
+    不會集中寫入同一份文件。leaderboards/{competition_id} 標記排行榜已由 competitions 建立。
+    排行榜寫入為盡力而為：寫入失敗時成績已保存在 competitions，下次查詢時重新由 competitions 建立。
+    監聽尚未完成首次同步時，改以 competitions 的 rank_key 索引查詢（需 competition_id + rank_key 複合索引）。
+    """
+    # 成績保存的欄位
+    ENTRY_FIELDS = ['user_id', 'quiz_id', 'correct_amount', 'question_amount', 'time_spent', 'time_ms', 'rank_key']
+
+    def __init__(self, firebaseService):
+        self._firebaseService = firebaseService
+        self._boards = {}
+        # 已開始監聽的競賽，及成績寫入失敗、需重新建立的競賽
+        self._started = set()
+        self._stale = set()
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+
+    @staticmethod
+    def entries_collection(competition_id: str) -> str:
+        """Returns
+        str: 競賽成績文件所在的集合路徑
+        """
+        return f'{DatabaseCollectionMap.LEADERBOARD}/{competition_id}/entries'
+
+    def _start(self, competition_id: str) -> bool:
+        """第一次使用競賽時確認排行榜已建立，並註冊成績文件的監聽
+
+        Returns:
+            bool: 是否已完成同步
+        """
+        if competition_id in self._stale:
+            self._rebuild(competition_id)
+        if competition_id not in self._started:
+            with self._start_lock:
+                if competition_id not in self._started:
+                    marker = self._firebaseService.get_data(DatabaseCollectionMap.LEADERBOARD, competition_id)
+                    if not (marker and marker.get('materialized')):
+                        self._build(competition_id)
+                    with self._lock:
+                        self._boards.setdefault(competition_id, Leaderboard())
+                    self._firebaseService.on_snapshot(
+                        self.entries_collection(competition_id),
+                        lambda change_type, doc_id, data: self._on_change(competition_id, change_type, doc_id, data)
+                    )
+                    self._started.add(competition_id)
+        return self._firebaseService.wait_cache_ready(self.entries_collection(competition_id))
+
+    def _on_change(self, competition_id: str, change_type: str, doc_id: str, data: dict):
+        with self._lock:
+            board = self._boards.setdefault(competition_id, Leaderboard())
+            if change_type == 'REMOVED':
+                board.remove(doc_id)
+            else:
+                board.add(data)
+
+    def _build(self, competition_id: str):
+        """由 competitions 建立競賽的成績文件，並寫入已建立的標記"""
+        competitions = self._firebaseService.filter_data(
+            DatabaseCollectionMap.COMPETITION,
+            [('competition_id', '==', competition_id), ('time_spent', '!=', '')],
+            fields=self.ENTRY_FIELDS
+        )
+        users = {
+            user['userId']: user
+            for user in self._firebaseService.get_multiple_data(DatabaseCollectionMap.USER, list({competition['user_id'] for competition in competitions}))
+        } if competitions else {}
+        # 多個程序同時建立時寫入的內容相同，重複寫入不影響結果
+        with self._firebaseService.batch() as batch:
+            for competition in competitions:
+                entry = self.create_entry(competition, users.get(competition['user_id'], {}))
+                batch.add_data(self.entries_collection(competition_id), entry['user_id'], entry)
+            batch.add_data(DatabaseCollectionMap.LEADERBOARD, competition_id, {'competition_id': competition_id, 'materialized': True})
+
+    def _rebuild(self, competition_id: str):
+        """成績寫入失敗後重新由 competitions 建立，監聽會同步重寫的成績"""
+        try:
+            self._build(competition_id)
+            self._stale.discard(competition_id)
+        except Exception as e:
+            print(f'Failed to rebuild leaderboard {competition_id}: {e}')
+
+    def create_entry(self, competition: dict, user_info: dict) -> dict:
+        """Returns
+        dict: 排行榜成績（含顯示用的使用者名稱與頭像，查詢排行榜時不需再讀取 users）
+        """
+        entry = {field: competition.get(field) for field in self.ENTRY_FIELDS}
+        entry.update({
+            'displayName': user_info.get('displayName') or '-',
+            'pictureUrl': user_info.get('pictureUrl', '')
+        })
+        return entry
+
+    def record(self, competition_id: str, entry: dict):
+        """記錄使用者完成競賽的成績（盡力而為，失敗時不拋出例外）
+
+        Args:
+            competition_id (str): 競賽ID
+            entry (dict): create_entry 產生的成績
+        """
+        try:
+            self._start(competition_id)
+            with self._lock:
+                self._boards.setdefault(competition_id, Leaderboard()).add(entry)
+            self._firebaseService.add_data(self.entries_collection(competition_id), entry['user_id'], entry)
+        except Exception as e:
+            # 成績已保存在 competitions，下次查詢排行榜時重新建立
+            print(f'Failed to record leaderboard entry {competition_id}/{entry.get("user_id")}: {e}')
+            self._stale.add(competition_id)
+
+    def top(self, competition_id: str, n: int = 5) -> list:
+        """Returns
+        list: 前 n 名成績
+        """
+        if not self._start(competition_id):
+            return self._query_top(competition_id, n)
+        with self._lock:
+            return self._boards[competition_id].top(n)
+
+    def get(self, competition_id: str, user_id: str) -> dict:
+        """Returns
+        dict: 使用者成績（含名次），未參賽時為 None
+        """
+        if not self._start(competition_id):
+            return self._query_user(competition_id, user_id)
+        with self._lock:
+            return self._boards[competition_id].get(user_id)
+
+    def _query_top(self, competition_id: str, n: int) -> list:
+        """以 rank_key 索引查詢前 n 名（只讀取 n 筆）"""
+        competitions = self._firebaseService.filter_data(
+            DatabaseCollectionMap.COMPETITION,
+            [('competition_id', '==', competition_id), ('rank_key', '>', 0)],
+            order_by=('rank_key', 'asc'),
+            limit=n,
+            fields=self.ENTRY_FIELDS
+        )
+        if not competitions:
+            return []
+        users = {
+            user['userId']: user
+            for user in self._firebaseService.get_multiple_data(DatabaseCollectionMap.USER, list({competition['user_id'] for competition in competitions}))
+        }
+        entries = []
+        for index, competition in enumerate(competitions):
+            entry = self.create_entry(competition, users.get(competition['user_id'], {}))
+            # 與前一名排名鍵相同時名次相同
+            same_as_previous = index > 0 and competition['rank_key'] == competitions[index - 1]['rank_key']
+            entry['rank'] = entries[-1]['rank'] if same_as_previous else index + 1
+            entries.append(entry)
+        return entries
+
+    def _query_user(self, competition_id: str, user_id: str) -> dict:
+        """以 rank_key 索引計算使用者名次（排名鍵較小的筆數 + 1）"""
+        competitions = self._firebaseService.filter_data(
+            DatabaseCollectionMap.COMPETITION,
+            [('competition_id', '==', competition_id), ('user_id', '==', user_id)],
+            limit=1,
+            fields=self.ENTRY_FIELDS
+        )
+        if not competitions or competitions[0].get('rank_key') is None:
+            return None
+        entry = competitions[0]
+        ahead = self._firebaseService.get_aggregate_count(
+            DatabaseCollectionMap.COMPETITION,
+            [('competition_id', '==', competition_id), ('rank_key', '<', entry['rank_key'])]
+        )
+        return dict(entry, rank=ahead + 1)
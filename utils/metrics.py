@@ -0,0 +1,152 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+class FirestoreMetrics:
+    """
+    Firestore 操作統計
+
+    每次操作記錄操作類型、集合、文件數量及耗時：
+    - 請求範圍：以 contextvars 累計，於請求（或事件）結束時取得總數
+    - 程序範圍：依 (操作類型, 集合) 累計次數、文件數及延遲分佈
+    """
+    # 延遲分桶上限（毫秒），最後一桶為超過最大值的次數
+    LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self):
+        self._request_operations = contextvars.ContextVar('firestore_request_operations', default=None)
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def start_request(self):
+        """開始記錄請求範圍的操作
+
+        Returns:
+            contextvars.Token: 結束時傳入 end_request
+        """
+        return self._request_operations.set([])
+
+    def end_request(self, token):
+        """結束記錄請求範圍的操作
+
+        Returns:
+            dict: 本次請求的操作總數、文件數、耗時及各操作明細
+        """
+        operations = self._request_operations.get() or []
+        self._request_operations.reset(token)
+        return {
+            'operations': len(operations),
+            'documents': sum(operation['documents'] for operation in operations),
+            'elapsed_ms': round(sum(operation['elapsed_ms'] for operation in operations), 2),
+            'details': operations
+        }
+
+    def record(self, operation, collection, documents, elapsed_ms):
+        """記錄一次操作"""
+        operations = self._request_operations.get()
+        if operations is not None:
+            operations.append({
+                'operation': operation,
+                'collection': collection,
+                'documents': documents,
+                'elapsed_ms': round(elapsed_ms, 2)
+            })
+
+        bucket_index = len(self.LATENCY_BUCKETS_MS)
+        for index, upper_bound in enumerate(self.LATENCY_BUCKETS_MS):
+            if elapsed_ms <= upper_bound:
+                bucket_index = index
+                break
+
+        with self._lock:
+            histogram = self._histograms.setdefault((operation, collection), {
+                'count': 0,
+                'documents': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'buckets': [0] * (len(self.LATENCY_BUCKETS_MS) + 1)
+            })
+            histogram['count'] += 1
+            histogram['documents'] += documents
+            histogram['total_ms'] += elapsed_ms
+            histogram['max_ms'] = max(histogram['max_ms'], elapsed_ms)
+            histogram['buckets'][bucket_index] += 1
+
+    @contextmanager
+    def track(self, operation, collection):
+        """計時區塊內的操作，可於區塊內設定 record['documents']
+
+        Example:
+            with firestore_metrics.track('get_all', 'users') as record:
+                docs = ...
+                record['documents'] = len(docs)
+        """
+        record = {'documents': 0}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self.record(operation, collection, record['documents'], (time.perf_counter() - start) * 1000)
+
+    def instrument(self, operation, documents=None):
+        """裝飾 FireBaseService 的方法，第一個參數視為集合名稱
+
+        Args:
+            operation (str): 操作類型
+            documents (int, optional): 固定的文件數量（寫入操作），未指定時依回傳值計算
+        """
+        def decorator(func):
+            @wraps(func)
+            def wrapper(service, *args, **kwargs):
+                collection = args[0] if args else kwargs.get('collection', '')
+                with self.track(operation, collection) as record:
+                    result = func(service, *args, **kwargs)
+                    record['documents'] = documents if documents is not None else self._count_documents(result)
+                return result
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _count_documents(result):
+        """Returns
+        int: 回傳值對應的文件數量
+        """
+        if isinstance(result, tuple):
+            # page() 回傳 (文件列表, 游標)
+            result = result[0]
+        if isinstance(result, list):
+            return len(result)
+        return 0 if result is None else 1
+
+    def snapshot(self):
+        """Returns
+        list: 程序範圍的各操作統計（依總耗時由大到小排序）
+        """
+        with self._lock:
+            histograms = [
+                {
+                    'operation': operation,
+                    'collection': collection,
+                    'count': histogram['count'],
+                    'documents': histogram['documents'],
+                    'avg_ms': round(histogram['total_ms'] / histogram['count'], 2),
+                    'max_ms': round(histogram['max_ms'], 2),
+                    'total_ms': round(histogram['total_ms'], 2),
+                    'buckets': dict(zip(
+                        [f'<={upper_bound}ms' for upper_bound in self.LATENCY_BUCKETS_MS] + [f'>{self.LATENCY_BUCKETS_MS[-1]}ms'],
+                        histogram['buckets']
+                    ))
+                }
+                for (operation, collection), histogram in self._histograms.items()
+            ]
+        return sorted(histograms, key=lambda histogram: histogram['total_ms'], reverse=True)
+
+    def reset(self):
+        """清除程序範圍的統計"""
+        with self._lock:
+            self._histograms.clear()
+
+# 全域統計實例
+firestore_metrics = FirestoreMetrics()
@@ -0,0 +1,136 @@
+from map import DatabaseCollectionMap
+import heapq
+import random
+import threading
+
+class QuizQuestionPool:
+    """
+    記憶體中的測驗題庫
+
+    第一次使用時以 on_snapshot 監聽 quiz_questions，依 (類別, 是否為競賽題) 分組保存題目 ID，
+    抽題時直接在本地抽樣，不需每次查詢整個類別；題目內容與作答統計隨監聽更新。
+    回傳的題目皆為複本，呼叫端可自由修改。
+    題目的 correct_rate 一律由 correct_count / total_count 計算，不使用文件中保存的值。
+    """
+    def __init__(self, firebaseService):
+        self._firebaseService = firebaseService
+        self._questions = {}
+        # (category, is_competition) -> 題目文件ID列表，搭配位置索引以 O(1) 移除
+        self._groups = {}
+        self._positions = {}
+        # 題目的 id 欄位 -> 文件ID
+        self._ids = {}
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._started = False
+
+    def _start(self) -> bool:
+        """第一次使用時註冊監聽
+
+        Returns:
+            bool: 題庫是否已完成同步
+        """
+        if not self._started:
+            # 註冊時會重播已快取的題目並呼叫 _on_change，因此使用另一個鎖，等重播完成才視為已啟動
+            with self._start_lock:
+                if not self._started:
+                    self._firebaseService.on_snapshot(DatabaseCollectionMap.QUIZ_QUESTION, self._on_change)
+                    self._started = True
+        return self._firebaseService.wait_cache_ready(DatabaseCollectionMap.QUIZ_QUESTION)
+
+    @staticmethod
+    def with_correct_rate(question: dict) -> dict:
+        """依作答計數設定題目的 correct_rate（計數以 Increment 累加，同時作答也不會互相覆蓋）
+
+        Returns:
+            dict: 傳入的題目
+        """
+        total_count = question.get('total_count', 0)
+        question['correct_rate'] = round((question.get('correct_count', 0) / total_count)*100, 2) if total_count > 0 else 0
+        return question
+
+    def _on_change(self, change_type: str, doc_id: str, data: dict):
+        with self._lock:
+            self._remove(doc_id)
+            if change_type != 'REMOVED':
+                self._questions[doc_id] = self.with_correct_rate(data)
+                self._ids[data.get('id')] = doc_id
+                group = self._groups.setdefault((data.get('category'), bool(data.get('is_competition'))), [])
+                self._positions[doc_id] = len(group)
+                group.append(doc_id)
+
+    def _remove(self, doc_id: str):
+        """移除題目（呼叫端需持有 _lock）"""
+        data = self._questions.pop(doc_id, None)
+        if data is None:
+            return
+        if self._ids.get(data.get('id')) == doc_id:
+            del self._ids[data.get('id')]
+        group = self._groups[(data.get('category'), bool(data.get('is_competition')))]
+        # 與最後一個交換後移除
+        position = self._positions.pop(doc_id)
+        last_doc_id = group.pop()
+        if last_doc_id != doc_id:
+            group[position] = last_doc_id
+            self._positions[last_doc_id] = position
+
+    def sample(self, category: str, is_competition: bool, k: int) -> list:
+        """隨機抽取題目
+
+        Args:
+            category (str): 題目類別
+            is_competition (bool): 是否為競賽題
+            k (int): 題數
+
+        Returns:
+            list: 題目列表，題目數量不足時拋出 ValueError（與 random.sample 相同）
+        """
+        if not self._start():
+            # 題庫尚未同步完成，改為直接查詢
+            questions = self._firebaseService.filter_data(DatabaseCollectionMap.QUIZ_QUESTION, [('category', '==', category), ('is_competition', '==', is_competition)])
+            return [self.with_correct_rate(question) for question in random.sample(questions, k)]
+        with self._lock:
+            doc_ids = random.sample(self._groups.get((category, is_competition), []), k)
+            return [dict(self._questions[doc_id]) for doc_id in doc_ids]
+
+    def get(self, question_id: int) -> dict:
+        """Returns
+        dict: id 欄位為 question_id 的題目，不存在時為 None
+        """
+        if not self._start():
+            questions = self._firebaseService.filter_data(DatabaseCollectionMap.QUIZ_QUESTION, [('id', '==', int(question_id))])
+            return self.with_correct_rate(questions[0]) if questions else None
+        with self._lock:
+            doc_id = self._ids.get(int(question_id))
+            return dict(self._questions[doc_id]) if doc_id is not None else None
+
+    def get_category(self, category: str) -> list:
+        """Returns
+        list: 該類別的所有題目（含一般及競賽題）
+        """
+        if not self._start():
+            questions = self._firebaseService.filter_data(DatabaseCollectionMap.QUIZ_QUESTION, [('category', '==', category)])
+            return [self.with_correct_rate(question) for question in questions]
+        with self._lock:
+            return [
+                dict(self._questions[doc_id])
+                for is_competition in (False, True)
+                for doc_id in self._groups.get((category, is_competition), [])
+            ]
+
+    def lowest_correct_rate(self, category: str, k: int = 10) -> list:
+        """Returns
+        list: 該類別有作答紀錄的題目中，正確率最低的 k 題（由低到高）
+        """
+        if not self._start():
+            questions = self._firebaseService.filter_data(DatabaseCollectionMap.QUIZ_QUESTION, [('category', '==', category), ('total_count', '>', 0)])
+            questions = [self.with_correct_rate(question) for question in questions]
+            return heapq.nsmallest(k, questions, key=lambda question: question['correct_rate'])
+        with self._lock:
+            questions = [
+                self._questions[doc_id]
+                for is_competition in (False, True)
+                for doc_id in self._groups.get((category, is_competition), [])
+                if self._questions[doc_id].get('total_count', 0) > 0
+            ]
+            return [dict(question) for question in heapq.nsmallest(k, questions, key=lambda question: question['correct_rate'])]
@@ -0,0 +1,74 @@
+from collections import OrderedDict
+import threading
+
+class ResponseCache:
+    """
+    已產生的回覆內容快取（例如 Flex JSON）
+
+    快取鍵為 (功能, 參數, 來源集合版本)。來源集合第一次使用時以 on_snapshot 監聽，
+    集合有任何變更時版本加一，舊版本的快取自然不再命中；
+    同程序內的寫入（例如後台編輯）可呼叫 invalidate 立即更新版本。
+    """
+    def __init__(self, firebaseService, max_size: int = 256):
+        self._firebaseService = firebaseService
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def _watch(self, collection: str):
+        """第一次使用集合時註冊變更監聽"""
+        with self._lock:
+            if collection in self._versions:
+                return
+            self._versions[collection] = 0
+        self._firebaseService.on_snapshot(collection, lambda change_type, doc_id, data: self.invalidate(collection))
+
+    def invalidate(self, collection: str):
+        """將集合版本加一，使依賴此集合的快取失效
+
+        Args:
+            collection (str): 集合名稱
+        """
+        with self._lock:
+            if collection in self._versions:
+                self._versions[collection] += 1
+
+    def get_or_render(self, feature: str, params: tuple, collections: list, render):
+        """取得快取的回覆內容，未命中時呼叫 render 產生並存入快取
+
+        Args:
+            feature (str): 功能名稱
+            params (tuple): 影響回覆內容的參數（需可 hash）
+            collections (list): 回覆內容依賴的集合
+            render (callable): 產生回覆內容的函式
+
+        Returns:
+            回覆內容
+        """
+        for collection in collections:
+            self._watch(collection)
+        with self._lock:
+            key = (feature, params, tuple(self._versions[collection] for collection in collections))
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return self._entries[key]
+            self._stats['misses'] += 1
+
+        value = render()
+        with self._lock:
+            # 產生期間集合有變更時，版本已不同，不存入快取
+            if key[2] == tuple(self._versions[collection] for collection in collections):
+                self._entries[key] = value
+                while len(self._entries) > self._max_size:
+                    self._entries.popitem(last=False)
+        return value
+
+    def stats(self) -> dict:
+        """Returns
+        dict: 命中、未命中次數及快取數量
+        """
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
@@ -0,0 +1,92 @@
+from map import DatabaseCollectionMap
+import random
+import threading
+
+class ScoreHistograms:
+    """
+    各測驗類別的答對題數分布
+
+    分布保存於 score_histograms/{category}_{shard} 的 buckets 欄位（答對題數 -> 人數），
+    每個類別分成多個分片文件，完成測驗時只遞增隨機一個分片的一個 bucket，避免同一文件寫入過於頻繁；
+    遞增以合併寫入（文件不存在時建立）排入呼叫端的 batch，與測驗紀錄一起 commit。
+    第一次使用時以 on_snapshot 同步至記憶體並加總各分片，擊敗比例直接在本地以 O(bucket 數) 計算。
+    """
+    def __init__(self, firebaseService, shards: int = 10):
+        """
+        Args:
+            shards (int): 每個類別的分片數量
+        """
+        self._firebaseService = firebaseService
+        self._shards = shards
+        # 分片文件ID -> (類別, {答對題數: 人數})
+        self._shard_buckets = {}
+        # 類別 -> {答對題數: 人數}（各分片加總）
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._started = False
+
+    def _start(self) -> bool:
+        """第一次使用時註冊監聽並等待首次同步
+
+        Returns:
+            bool: 是否已完成同步
+        """
+        if not self._started:
+            with self._start_lock:
+                if not self._started:
+                    self._firebaseService.on_snapshot(DatabaseCollectionMap.SCORE_HISTOGRAM, self._on_change)
+                    self._started = True
+        return self._firebaseService.wait_cache_ready(DatabaseCollectionMap.SCORE_HISTOGRAM)
+
+    def _on_change(self, change_type: str, doc_id: str, data: dict):
+        with self._lock:
+            self._apply(doc_id, None if change_type == 'REMOVED' else (
+                data.get('category'),
+                {int(score): count for score, count in (data.get('buckets') or {}).items()}
+            ))
+
+    def _apply(self, doc_id: str, shard):
+        """以新的分片內容取代舊的，並更新類別加總（呼叫端需持有 _lock）
+
+        Args:
+            doc_id (str): 分片文件ID
+            shard (tuple): (類別, {答對題數: 人數})，None 表示分片已刪除
+        """
+        previous = self._shard_buckets.pop(doc_id, None)
+        if previous is not None:
+            totals = self._buckets.get(previous[0], {})
+            for score, count in previous[1].items():
+                totals[score] = totals.get(score, 0) - count
+        if shard is not None:
+            self._shard_buckets[doc_id] = shard
+            totals = self._buckets.setdefault(shard[0], {})
+            for score, count in shard[1].items():
+                totals[score] = totals.get(score, 0) + count
+
+    def record(self, batch, category: str, correct_amount: int):
+        """將一次測驗的答對題數排入 batch（記憶體中的分布於監聽收到變更後更新）
+
+        Args:
+            batch: FireBaseBatch，由呼叫端 commit
+            category (str): 測驗類別
+            correct_amount (int): 答對題數
+        """
+        batch.merge_data(DatabaseCollectionMap.SCORE_HISTOGRAM, f'{category}_{random.randrange(self._shards)}', {
+            'category': category,
+            'buckets': {str(correct_amount): self._firebaseService.increment(1)}
+        })
+
+    def defeat_rate(self, category: str, correct_amount: int) -> float:
+        """計算尚未記錄的一次測驗結果的擊敗比例（總人數含本次）
+
+        Returns:
+            float: 該類別中答對題數少於 correct_amount 的比例（%），分布尚未同步時為 None
+        """
+        if not self._start():
+            return None
+        with self._lock:
+            buckets = self._buckets.get(category, {})
+            total = sum(buckets.values()) + 1
+            defeat = sum(count for score, count in buckets.items() if score < correct_amount)
+        return round(defeat / total * 100, 2)
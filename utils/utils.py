@@ -2,7 +2,8 @@ import random
 import re
 import pytz
 from datetime import datetime
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, List, Tuple, Union
 
 def get_current_time():
     """Returns
@@ -49,10 +50,105 @@ def camel_to_snake_case(data: Dict[str, Any]) -> Dict[str, Any]:
     
     return {convert(k): v for k, v in data.items()}
 
+VARIABLE_PATTERN = re.compile(r'\{\{([a-zA-Z0-9_]*)\}\}')
+
+class RenderedTemplate(str):
+    """模板替換後的文字，template 為產生此文字的模板
+
+    與一般字串用法相同；訊息格式檢查會依 template 快取結構檢查的結果（同一模板只完整檢查一次）。
+    字串經串接等操作後即為一般 str，不再帶有 template。
+    """
+    def __new__(cls, text: str, template):
+        rendered = super().__new__(cls, text)
+        rendered.template = template
+        return rendered
+
+class CompiledTemplate:
+    """預先解析的 {{variable}} 模板
+
+    模板只解析一次，拆成文字片段與變數名稱交錯的列表，render 時依序串接，
+    不需要每次以正規表示式掃描整個字串。
+
+    render 可傳入多層變數，每一層可為 dict 或 (dict, max_count)，
+    效果等同依序呼叫 replace_variable，但只走訪模板一次：
+        >>> template = compile_template("{{star}}{{star}}{{star}}")
+        >>> template.render(({"star": "★"}, 2), {"star": "☆"})
+        '★★☆'
+    """
+    __slots__ = ('literals', 'keys', '__weakref__')
+
+    def __init__(self, text: str):
+        parts = VARIABLE_PATTERN.split(text)
+        # split 後偶數位置為文字片段，奇數位置為變數名稱
+        self.literals: List[str] = parts[0::2]
+        self.keys: List[str] = parts[1::2]
+
+    def render(self, *layers: Union[Dict[str, Any], Tuple[Dict[str, Any], int]]) -> str:
+        """替換模板中的變數
+
+        Args:
+            *layers: 變數層，dict 或 (dict, max_count)；max_count 為該層每個變數的最大替換次數，0 為無限制。
+                每個變數位置由第一個「有該變數且尚未超過次數」的層替換，都沒有時保留原本的 {{variable}}
+
+        Returns:
+            RenderedTemplate: 替換變數後的文字
+        """
+        layers = [layer if isinstance(layer, tuple) else (layer, 0) for layer in layers]
+        literals = self.literals
+        if not self.keys:
+            return RenderedTemplate(literals[0], self)
+
+        # 常見情況：單層且無次數限制
+        if len(layers) == 1 and not layers[0][1]:
+            variable_dict = layers[0][0]
+            result = [literals[0]]
+            for key, literal in zip(self.keys, literals[1:]):
+                result.append(str(variable_dict[key]) if key in variable_dict else f'{{{{{key}}}}}')
+                result.append(literal)
+            return RenderedTemplate(''.join(result), self)
+
+        counts = [{} for _ in layers]
+        result = [literals[0]]
+        for key, literal in zip(self.keys, literals[1:]):
+            value = f'{{{{{key}}}}}'
+            for index, (variable_dict, max_count) in enumerate(layers):
+                if max_count:
+                    # 與依序呼叫 replace_variable 相同：前面的層沒替換的位置才會計入這一層的次數
+                    counts[index][key] = counts[index].get(key, 0) + 1
+                    if counts[index][key] > max_count:
+                        continue
+                if key in variable_dict:
+                    value = str(variable_dict[key])
+                    break
+            result.append(value)
+            result.append(literal)
+        return RenderedTemplate(''.join(result), self)
+
+    def render_many(self, variable_dicts: List[Dict[str, Any]]) -> List[str]:
+        """以多組變數分別替換模板
+
+        Returns:
+            List[str]: 各組變數替換後的文字
+        """
+        return [self.render(variable_dict) for variable_dict in variable_dicts]
+
+@lru_cache(maxsize=256)
+def compile_template(text: str) -> CompiledTemplate:
+    """取得解析後的模板（依模板內容快取，模板更新後內容不同即重新解析）
+
+    Args:
+        text (str): 包含 {{variable}} 格式變數的文字
+
+    Returns:
+        CompiledTemplate: 解析後的模板
+    """
+    return CompiledTemplate(text)
+
 def replace_variable(text: str, variable_dict: Dict[str, Any], max_count: int = 0) -> str:
     """替換文字中的變數。
     
     將文字中的 {{variable}} 格式的變數替換為 variable_dict 中對應的值。
+    重複使用的模板（如 line_flex）請改用 compile_template 以快取解析結果。
     
     Args:
         text (str): 包含 {{variable}} 格式變數的文字
@@ -66,18 +162,4 @@ def replace_variable(text: str, variable_dict: Dict[str, Any], max_count: int =
         >>> replace_variable("Hello {{name}}!", {"name": "World"})
         'Hello World!'
     """
-    replaced_count: Dict[str, int] = {}
-    
-    def replace(match: re.Match) -> str:
-        key = match.group(1)
-        if max_count:
-            if key not in replaced_count:
-                replaced_count[key] = 1
-            else:
-                replaced_count[key] += 1
-                if replaced_count[key] > max_count:
-                    return match.group(0)
-        return str(variable_dict.get(key, match.group(0)))
-
-    pattern = r'\{\{([a-zA-Z0-9_]*)\}\}'
-    return re.sub(pattern, replace, text) 
\ No newline at end of file
+    return CompiledTemplate(text).render((variable_dict, max_count))
\ No newline at end of file